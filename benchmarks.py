@@ -0,0 +1,480 @@
+'''
+Synthetic benchmarks and load tests. None of these touch Discord, so they can be ran anywhere, except `pageload`, which loads LinkedIn in Chrome.
+
+Usage: `python benchmarks.py <benchmark> [options]`. Run with `-h` for the list of benchmarks.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+from time import perf_counter, sleep, time
+
+
+def percentile(data: list[float], pct: float) -> float:
+    data = sorted(data)
+    if not data:
+        return 0.0
+    return data[min(len(data) - 1, round(pct / 100 * (len(data) - 1)))]
+
+def report_latencies(label: str, latencies: list[float]) -> None:
+    print(
+        f'{label}: n={len(latencies)}',
+        f'mean={statistics.fmean(latencies) * 1000:.1f}ms' if latencies else 'mean=n/a',
+        *(f'p{pct}={percentile(latencies, pct) * 1000:.1f}ms' for pct in (50, 90, 99)),
+        sep='  '
+    )
+
+# ---------------------------------------
+#             Member Joins
+# ---------------------------------------
+class _FakeJoinMember:
+    def __init__(self, name: str, api_latency: float) -> None:
+        self.name = name
+        self.discriminator = '0'
+        self.roles = []
+        self._api_latency = api_latency
+
+    async def add_roles(self, *roles):
+        await asyncio.sleep(self._api_latency)
+        self.roles.extend(roles)
+
+def bench_joins(args: argparse.Namespace) -> None:
+    '''
+    Replay a rush of joins against a fake guild through `JoinPipeline`.
+    '''
+    from source.tools.join_pipeline import JoinPipeline
+
+    roster = {f'user{i}' for i in range(args.joins) if random.random() < args.roster_ratio}
+    lookups = 0
+
+    def resolve(members):
+        nonlocal lookups
+        lookups += 1
+        sleep(args.lookup_latency) # a roster lookup costs the same regardless of batch size
+        return [member.name in roster for member in members]
+
+    async def run():
+        pipeline = JoinPipeline(resolve=resolve, role=object(), batch_size=args.batch_size, workers=args.workers, rate=args.rate)
+        start = perf_counter()
+        for i in range(args.joins):
+            pipeline.submit(_FakeJoinMember(f'user{i}', args.api_latency))
+            await asyncio.sleep(args.join_interval)
+        await pipeline.drain()
+        elapsed = perf_counter() - start
+        await pipeline.stop()
+
+        print(f'{args.joins} joins in {elapsed:.2f}s, {lookups} roster lookups, {pipeline.granted} roles given, {pipeline.skipped} not on roster, {pipeline.failed} failed')
+        report_latencies('join -> role', pipeline.latencies)
+
+    asyncio.run(run())
+
+# ---------------------------------------
+#                 Embeds
+# ---------------------------------------
+def bench_embeds(args: argparse.Namespace) -> None:
+    '''
+    Compare `generate_embed` against a compiled `EmbedTemplate` for a scraper job embed.
+    '''
+    from timeit import repeat
+    from source.tools.ui_helper import generate_embed, EmbedTemplate
+
+    static = {
+        'color': 0x072c59,
+        'footer': {'text': 'Data Science UCSB', 'icon_url': 'https://example.com/icon.png'},
+        'thumbnail': 'https://example.com/thumbnail.png'
+    }
+    dynamic = {
+        'author': {'name': 'Company', 'url': 'https://example.com/company', 'icon_url': 'https://example.com/logo.png'},
+        'title': 'Data Scientist',
+        'url': 'https://example.com/job',
+        'fields': [
+            {'name': 'Location', 'value': 'Santa Barbara, CA'},
+            {'name': 'Salary', 'value': '$82,600/yr - $153,100/yr'},
+            {'name': 'Job Type', 'value': 'On-site · Full-time · Entry level'},
+            {'name': 'Skills', 'value': ', '.join(['Python', 'SQL', 'Statistics'] * args.skills)},
+        ]
+    }
+    template = EmbedTemplate(static)
+
+    for label, func in (
+        ('generate_embed', lambda: generate_embed({**static, **dynamic})),
+        ('EmbedTemplate.render', lambda: template.render(dynamic)),
+    ):
+        best = min(repeat(func, number=args.number, repeat=5))
+        print(f'{label}: {best / args.number * 1e6:.2f}us per embed')
+
+# ---------------------------------------
+#             Multiple Guilds
+# ---------------------------------------
+def _guilds_worker(args: argparse.Namespace) -> None:
+    # sets up a bot for `args.worker` guilds without logging in, then prints its memory use and throughput as JSON
+    import resource
+    import discord
+    from discord.ext import commands
+    from source.tools.config import BotConfig, _parse
+    from source.tools.event_bus import EventBus
+    from source.tools.plugin_loader import PluginLoader
+    from source.tools.scheduler import Scheduler
+    from source.tools.fake_discord import FakeDiscord
+
+    async def run():
+        start = perf_counter()
+        config = _parse(BotConfig, {'guilds': [
+            {
+                'server_id': guild_id,
+                'help_config': {'channel': guild_id, 'message_id': guild_id},
+                'class_roles_config': {'roles': {'Freshman': guild_id}, 'message_id': guild_id + 1},
+                'announcement_role_config': {'role': guild_id, 'message_id': guild_id + 2}
+            }
+            for guild_id in range(1000, 1000 + args.worker * 10, 10)
+        ]}, 'benchmark')
+        bot = commands.Bot(command_prefix='$', intents=discord.Intents.none(), help_command=None)
+        bot.plugins = PluginLoader(bot=bot, config=config, event_bus=EventBus(), scheduler=Scheduler(), throttle=None)
+        bot.plugins.discover()
+        bot.plugins.register_all()
+        bot.plugins.register_all_views()
+        setup = perf_counter() - start
+
+        guilds = bot.plugins.guilds
+        fake = FakeDiscord(client=bot, guild_ids=config.guild_ids, members=1, channels=1, limits={})
+        start = perf_counter()
+        for i in range(args.interactions):
+            guild = guilds[i % len(guilds)]
+            command = bot.tree.get_command('ping', guild=guild)
+            await command.callback(command.binding, fake.interaction(guild.id))
+        elapsed = perf_counter() - start
+
+        print(json.dumps({
+            'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'setup': setup,
+            'throughput': args.interactions / elapsed
+        }))
+
+    asyncio.run(run())
+
+def bench_guilds(args: argparse.Namespace) -> None:
+    '''
+    Compare memory and throughput of one process serving every guild against one process per guild.
+    '''
+    if args.worker:
+        return _guilds_worker(args)
+
+    def spawn(guilds: int, interactions: int) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, __file__, 'guilds', '--worker', str(guilds), '--interactions', str(interactions)],
+            stdout=subprocess.PIPE, text=True
+        )
+
+    def collect(processes: list[subprocess.Popen]) -> list[dict]:
+        return [json.loads(process.communicate()[0].splitlines()[-1]) for process in processes]
+
+    start = perf_counter()
+    single = collect([spawn(args.guilds, args.interactions)])[0]
+    single_wall = perf_counter() - start
+
+    start = perf_counter()
+    per_guild = collect([spawn(1, args.interactions // args.guilds) for _ in range(args.guilds)])
+    per_guild_wall = perf_counter() - start
+
+    print(f'{args.guilds} guilds, {args.interactions} interactions')
+    print(f'one process:       {single["rss_kb"] / 1024:.1f} MiB, setup {single["setup"] * 1000:.0f}ms, {single["throughput"]:.0f} interactions/s, {single_wall:.2f}s wall')
+    print(
+        f'process per guild: {sum(result["rss_kb"] for result in per_guild) / 1024:.1f} MiB total',
+        f'setup {statistics.fmean(result["setup"] for result in per_guild) * 1000:.0f}ms each',
+        f'{sum(result["throughput"] for result in per_guild):.0f} interactions/s combined',
+        f'{per_guild_wall:.2f}s wall',
+        sep=', '
+    )
+
+# ---------------------------------------
+#               Load Test
+# ---------------------------------------
+def bench_load(args: argparse.Namespace) -> None:
+    '''
+    Fire concurrent /send, role menu and help button interactions at the real handlers, over a fake Discord.
+    '''
+    import discord
+    from discord.ext import commands
+    from source.tools.config import BotConfig, _parse
+    from source.tools.event_bus import EventBus
+    from source.tools.fake_discord import FakeDiscord, DEFAULT_LIMITS
+    from source.tools.plugin_loader import PluginLoader, MOD_PERMISSIONS
+    from source.tools.scheduler import Scheduler
+    from source.tools.throttle import Throttle
+
+    guild_id = 1000
+    roles = {'Freshman': 1, 'Sophomore': 2, 'Junior': 3, 'Senior': 4}
+
+    async def run():
+        bot = commands.Bot(command_prefix='$', intents=discord.Intents.none(), help_command=None)
+        fake = FakeDiscord(
+            client=bot, guild_ids=[guild_id], members=args.members, channels=args.channels, latency=args.latency,
+            limits={route: limit.scaled(args.rate_scale) for route, limit in DEFAULT_LIMITS.items()} if args.rate_scale else {}
+        )
+        guild = fake.guilds[guild_id]
+        config = _parse(BotConfig, {'guilds': [{
+            'server_id': guild_id,
+            'help_config': {'channel': guild.channels[0].id, 'message_id': 1},
+            'class_roles_config': {'roles': roles, 'message_id': 2},
+        }]}, 'benchmark')
+        throttle = Throttle() if args.throttle else None
+        bot.plugins = PluginLoader(bot=bot, config=config, event_bus=EventBus(), scheduler=Scheduler(), throttle=throttle)
+        bot.plugins.discover()
+        bot.plugins.register_all()
+
+        send = bot.tree.get_command('send', guild=discord.Object(guild_id))
+        bot.plugins.register_all_views()
+        views = {view.children[0].custom_id: view for view in bot.persistent_views}
+        role_menu, help_button = views[f'role-menu-{guild_id}'], views[f'support-button-{guild_id}']
+        scenarios = {
+            '/send': lambda i, interaction: fake.invoke(
+                send, interaction,
+                channel=random.choice(guild.channels), title='Load test', description=f'Message {i}',
+                mimic=interaction.user if i % 2 else None
+            ),
+            'role menu': lambda i, interaction: fake.press(role_menu, f'role-menu-{guild_id}', interaction, values=[random.choice(list(roles))]),
+            'help button': lambda i, interaction: fake.press(help_button, f'support-button-{guild_id}', interaction),
+        }
+
+        results = {name: [] for name in scenarios}
+        failures = 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def fire(i: int, name: str) -> None:
+            nonlocal failures
+            async with semaphore:
+                interaction = fake.interaction(guild_id, user=random.choice(guild.members), permissions=MOD_PERMISSIONS) # /send is mod only
+                try:
+                    results[name].append(await scenarios[name](i, interaction))
+                except Exception:
+                    failures += 1
+
+        names = list(scenarios)
+        start = perf_counter()
+        await asyncio.gather(*(fire(i, names[i % len(names)]) for i in range(args.interactions)))
+        elapsed = perf_counter() - start
+
+        print(f'{args.interactions} interactions in {elapsed:.2f}s ({args.interactions / elapsed:.0f}/s), {failures} failed')
+        for name, timings in results.items():
+            report_latencies(f'{name} ack', [ack for ack, _ in timings if ack is not None])
+            report_latencies(f'{name} done', [done for _, done in timings])
+        print('API calls:', ', '.join(f'{route}={count}' for route, count in fake.http.calls.most_common()))
+        print('429s:', ', '.join(f'{route}={count}' for route, count in fake.http.rate_limited.most_common()) or 'none')
+        if throttle:
+            print('Throttled:', ', '.join(f'{feature} ({scope})={count}' for (feature, scope), count in throttle.throttled.most_common()) or 'none')
+
+    asyncio.run(run())
+
+# ---------------------------------------
+#            Leader Election
+# ---------------------------------------
+def _leader_worker(args: argparse.Namespace) -> None:
+    # competes for the lease in args.path, printing a JSON line each time it's elected or deposed
+    from source.tools.leader import LeaderElection, SQLiteLease
+
+    def report(event: str, delay: float = 0):
+        async def callback():
+            print(json.dumps({'event': event, 'pid': os.getpid(), 'time': time()}), flush=True)
+            await asyncio.sleep(delay) # like syncing commands after being elected
+        return callback
+
+    async def run():
+        election = LeaderElection(SQLiteLease(args.path), duration=args.lease, on_elected=report('elected', args.callback_delay), on_deposed=report('deposed'))
+        election.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+def bench_leader(args: argparse.Namespace) -> None:
+    '''
+    Run several instances competing for leadership, repeatedly kill the leader, and time how long until another takes over.
+    This is done with an instant `on_elected`, then with one taking twice the lease, which must not let the lease lapse.
+    '''
+    if args.worker:
+        return _leader_worker(args)
+    for delay in (0, args.lease * 2):
+        _leader_failovers(args, delay)
+
+def _leader_failovers(args: argparse.Namespace, callback_delay: float) -> None:
+    import queue
+    import tempfile
+    import threading
+
+    events = queue.Queue()
+    path = os.path.join(tempfile.mkdtemp(), 'leader.db')
+
+    def spawn() -> subprocess.Popen:
+        process = subprocess.Popen(
+            [sys.executable, __file__, 'leader', '--worker', '1', '--path', path, '--lease', str(args.lease), '--callback-delay', str(callback_delay)],
+            stdout=subprocess.PIPE, text=True
+        )
+        def read():
+            for line in process.stdout:
+                if line.startswith('{'):
+                    events.put(json.loads(line))
+        threading.Thread(target=read, daemon=True).start()
+        return process
+
+    processes = {process.pid: process for process in (spawn() for _ in range(args.instances))}
+    leaders, overlaps, failovers = set(), 0, []
+
+    def wait_for_leader(deadline: float, *, settle: bool = False) -> dict | None:
+        # returns the next election, keeping track of who believes they lead.
+        # while settling, every event until the deadline is read, so an election while a leader is alive counts as an overlap
+        nonlocal overlaps
+        while (remaining := deadline - time()) > 0:
+            try:
+                event = events.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if event['event'] == 'deposed':
+                leaders.discard(event['pid'])
+                continue
+            if leaders:
+                overlaps += 1
+            leaders.add(event['pid'])
+            if not settle:
+                return event
+        return None
+
+    try:
+        elected = wait_for_leader(time() + 30)
+        for _ in range(args.failovers):
+            if elected is None:
+                print('no leader was elected')
+                break
+            wait_for_leader(time() + callback_delay + args.lease, settle=True) # let the new leader renew its lease a few times
+            killed = time()
+            processes.pop(elected['pid']).kill() # no chance to release the lease, like a crash
+            leaders.discard(elected['pid'])
+            process = spawn()
+            processes[process.pid] = process
+            elected = wait_for_leader(killed + args.lease * 5)
+            if elected:
+                failovers.append(elected['time'] - killed)
+    finally:
+        for process in processes.values():
+            process.kill()
+
+    print(f'{args.instances} instances, {args.lease}s lease, {callback_delay}s on_elected, {len(failovers)} of {args.failovers} failovers, {overlaps} times two leaders at once')
+    report_latencies('kill -> new leader', failovers)
+
+# ---------------------------------------
+#              Page Loads
+# ---------------------------------------
+def _transferred(driver) -> int:
+    # bytes received over the network since the last call, from Chrome's performance log
+    total = 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            total += message['params']['encodedDataLength']
+    return total
+
+def bench_pageload(args: argparse.Namespace) -> None:
+    '''
+    Load each scraper query's LinkedIn search page with Chrome's default and lean profiles, comparing load time and bytes transferred.
+    Needs Chrome and a network connection.
+    '''
+    from urllib.parse import urlencode
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from linkedin_jobs_scraper.utils.chrome_driver import get_default_driver_options
+    from dataclasses import replace
+    from scraper_tools.web import browser_options
+    from source.tools.config import CONFIG
+
+    CONFIG.load('scraper')
+    pages = {
+        f'{query.search} ({location})': 'https://www.linkedin.com/jobs/search?' + urlencode({'keywords': query.search, 'location': location})
+        for query in CONFIG.scraper.queries for location in query.locations
+    }
+    profiles = {
+        'default': lambda: get_default_driver_options(headless=CONFIG.scraper.browser.headless),
+        'lean': lambda: browser_options(replace(CONFIG.scraper.browser, lean=True), 'benchmark'),
+    }
+
+    results = {(profile, page): [] for profile in profiles for page in pages}
+    for _ in range(args.repeat):
+        for page, url in pages.items():
+            for profile, make_options in profiles.items():
+                # a new Chrome per load, like the scraper starts for each query
+                options = make_options()
+                options.page_load_strategy = 'normal'
+                options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+                driver = webdriver.Chrome(options=options, service=Service(CONFIG.scraper.chromedriver) if CONFIG.scraper.chromedriver else None)
+                try:
+                    driver.set_page_load_timeout(CONFIG.scraper.page_load_timeout)
+                    _transferred(driver)
+                    start = perf_counter()
+                    driver.get(url)
+                    elapsed = perf_counter() - start
+                    results[(profile, page)].append((elapsed, _transferred(driver)))
+                finally:
+                    driver.quit()
+
+    for page in pages:
+        print(page)
+        for profile in profiles:
+            loads = results[(profile, page)]
+            report_latencies(f'  {profile} load', [elapsed for elapsed, _ in loads])
+            print(f'  {profile} transferred: mean={statistics.fmean(size for _, size in loads) / 1024:.0f}KiB')
+
+# ---------------------------------------
+#               Entry Point
+# ---------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(required=True)
+
+    joins = subparsers.add_parser('joins', help=bench_joins.__doc__)
+    joins.add_argument('--joins', type=int, default=1000)
+    joins.add_argument('--join-interval', type=float, default=0.001, help='Seconds between joins.')
+    joins.add_argument('--roster-ratio', type=float, default=0.8, help='Fraction of joins found on the roster.')
+    joins.add_argument('--lookup-latency', type=float, default=0.2, help='Seconds per roster lookup.')
+    joins.add_argument('--api-latency', type=float, default=0.05, help='Seconds per role edit.')
+    joins.add_argument('--batch-size', type=int, default=50)
+    joins.add_argument('--workers', type=int, default=4)
+    joins.add_argument('--rate', type=float, default=50.0, help='Role edits per second.')
+    joins.set_defaults(func=bench_joins)
+
+    embeds = subparsers.add_parser('embeds', help=bench_embeds.__doc__)
+    embeds.add_argument('--number', type=int, default=10000, help='Embeds built per timing.')
+    embeds.add_argument('--skills', type=int, default=50, help='Repetitions of the skills list, to make the field oversized.')
+    embeds.set_defaults(func=bench_embeds)
+
+    guilds = subparsers.add_parser('guilds', help=bench_guilds.__doc__)
+    guilds.add_argument('--guilds', type=int, default=5)
+    guilds.add_argument('--interactions', type=int, default=20000)
+    guilds.add_argument('--worker', type=int, default=0, help=argparse.SUPPRESS)
+    guilds.set_defaults(func=bench_guilds)
+
+    load = subparsers.add_parser('load', help=bench_load.__doc__)
+    load.add_argument('--interactions', type=int, default=3000)
+    load.add_argument('--concurrency', type=int, default=1000, help='most interactions in flight at once')
+    load.add_argument('--members', type=int, default=500)
+    load.add_argument('--channels', type=int, default=20)
+    load.add_argument('--latency', type=float, default=0.05, help='seconds each API call takes')
+    load.add_argument('--rate-scale', type=float, default=1.0, help='multiplies every rate limit. 0 disables them')
+    load.add_argument('--throttle', action='store_true', help="enforce the features' rate_limits")
+    load.set_defaults(func=bench_load)
+
+    leader = subparsers.add_parser('leader', help=bench_leader.__doc__)
+    leader.add_argument('--instances', type=int, default=3)
+    leader.add_argument('--failovers', type=int, default=5)
+    leader.add_argument('--lease', type=float, default=3.0, help='seconds each lease lasts')
+    leader.add_argument('--worker', type=int, default=0, help=argparse.SUPPRESS)
+    leader.add_argument('--path', help=argparse.SUPPRESS)
+    leader.add_argument('--callback-delay', type=float, default=0, help=argparse.SUPPRESS)
+    leader.set_defaults(func=bench_leader)
+
+    pageload = subparsers.add_parser('pageload', help=bench_pageload.__doc__)
+    pageload.add_argument('--repeat', type=int, default=3, help='loads of each page per profile')
+    pageload.set_defaults(func=bench_pageload)
+
+    args = parser.parse_args()
+    args.func(args)
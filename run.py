@@ -1,98 +1,89 @@
-import json
 import discord
-from discord.app_commands import Command, Group, ContextMenu, guild_only
 from discord.ext import commands
-from source.slash_commands import BaseCommand, BaseGroup
-from source.context_menu import BaseContextMenu
-from source.events import BaseEvent
-from source.persistent_ui import BasePersistentUI
-from source.background_tasks import BaseBackgroundTask
-
-
-# load the config file, create relevant objects
-with open('secrets/config.json') as file:
-    config = json.load(file)
-guild = discord.Object(config['server_id'])
-
-# create bot instances
-bot = commands.Bot(command_prefix='$', intents=discord.Intents.all(), help_command=None, activity=discord.Game(name='with Data'))
-tree = bot.tree
-
-def check_implementation(cls, **kwargs):
-    '''
-    Attempt to initialize a given class.\n
-    If successful, return an instance. Otherwise, raise an exception.
-    '''
-    try:
-        return cls(**kwargs)
-    except TypeError as e:
-        raise NotImplementedError(f'{cls.__name__} failed to override abstract method.') from e
-
-# set up server slash commands
-@guild_only
-class GuildGroup(Group):
-    pass
-
-@guild_only
-class GuildCommand(Command):
-    pass
-
-for group_class in BaseGroup.__subclasses__():
-    group = check_implementation(group_class)
-    guild_group = GuildGroup(name=group.name, description=group.desc)
-
-    for cmd_class in group.commands:
-        cmd_class._is_registered = True
-        cmd = check_implementation(cmd_class, bot=bot, config=config)
-        guild_group.add_command(GuildCommand(name=cmd.name, description=cmd.desc, callback=cmd.action))    
-    
-    tree.add_command(guild_group, guild=guild)
-
-for cmd_class in BaseCommand.__subclasses__():
-    if cmd_class._is_registered: continue
-
-    cmd = check_implementation(cmd_class, bot=bot, config=config)
-    tree.add_command(
-        GuildCommand(name=cmd.name, description=cmd.desc, callback=cmd.action), 
-        guild=guild
-    )
-
-@guild_only
-class GuildContext(ContextMenu):
-    pass
-
-# set up context menus
-for ctx_class in BaseContextMenu.__subclasses__():
-    ctx = check_implementation(ctx_class, bot=bot, config=config)
-    
-    tree.add_command(
-        GuildContext(name=ctx.name, callback=ctx.action),
-        guild=guild
-    )
-
-# set up events
-for event_class in BaseEvent.__subclasses__():
-    event = check_implementation(event_class, bot=bot, config=config)
-    setattr(bot, event.event, event.action)
-
-# set up persistent UI listeners and background tasts
+from source.tools.event_bus import EventBus
+from source.tools.command_sync import sync_all_commands
+from source.tools.plugin_loader import PluginLoader, NotMod, discover_plugins
+from source.tools.intents import client_options
+from source.tools.scheduler import Scheduler
+from source.tools.profiler import LoopMonitor, SamplingProfiler
+from source.tools.leader import LeaderElection, SQLiteLease
+from source.tools.throttle import SQLiteThrottle, Throttled
+from source.tools.config import CONFIG
+from source.tools.shared_features import TICKETS
+
+
+# load and validate the config files
+CONFIG.load('bot', 'key')
+
+# tickets from before multiple guilds were supported belong to the original guild, which is listed first
+TICKETS.claim_unassigned(CONFIG.bot.guild_ids[0])
+
+# find every plugin in source/. the events they listen to decide which intents are enabled,
+# so members and presences are only cached if some feature needs them
+plugins = discover_plugins('source')
+
+# create bot instances. a sharded bot spreads guilds across several gateway connections
+bot_class = commands.AutoShardedBot if CONFIG.bot.sharded else commands.Bot
+shard_options = {'shard_count': CONFIG.bot.shard_count} if CONFIG.bot.sharded else {}
+bot = bot_class(command_prefix='$', help_command=None, activity=discord.Game(name='with Data'), **client_options(plugins.values(), CONFIG.bot.intents), **shard_options)
+
+# register the commands, context menus and events of every plugin to every guild.
+# events are dispatched through the bus, which runs every handler concurrently,
+# and features declaring rate limits are throttled before they run
+bot.plugins = PluginLoader(bot=bot, config=CONFIG.bot, event_bus=EventBus(), scheduler=Scheduler(), throttle=SQLiteThrottle())
+bot.plugins.discover(plugins)
+bot.plugins.register_all()
+
+# watch for anything blocking the event loop. the profiler only runs when a mod starts it
+bot.monitor = LoopMonitor(threshold=CONFIG.bot.lag_threshold)
+bot.profiler = SamplingProfiler()
+
+# when several instances run, only the leader syncs commands and runs background tasks.
+# every instance serves interactions and events
+async def on_elected():
+    for guild in await sync_all_commands(bot.tree, bot.plugins.guilds):
+        print(f'Synced commands in {guild.id}.')
+    bot.plugins.scheduler.load() # the previous leader may have run tasks since this instance started
+    bot.plugins.start_all_tasks()
+
+async def on_deposed():
+    bot.plugins.stop_all_tasks()
+
+bot.leader = LeaderElection(SQLiteLease(), duration=CONFIG.bot.leader_lease, on_elected=on_elected, on_deposed=on_deposed)
+bot.plugins.scheduler.guard = lambda: bot.leader.is_leader # in case a task is due before on_deposed stops it
+
+def on_config_change(name: str) -> None:
+    if name == 'bot':
+        bot.plugins.register_all_views()
+        bot.monitor.threshold = CONFIG.bot.lag_threshold
+        bot.leader.duration = CONFIG.bot.leader_lease
+
+# the user was already told to slow down, so throttled commands aren't errors.
+# members using a mod only command are told they can't
+default_error_handler = bot.tree.on_error
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
+    if isinstance(error, NotMod):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+    elif not isinstance(error, Throttled):
+        await default_error_handler(interaction, error)
+
+# set up persistent UI listeners, start the loop monitor, and watch the config files for changes.
+# persistent UI is registered again on change, in case a message ID changed
 @bot.event
 async def setup_hook():
-    for ui_class in BasePersistentUI.__subclasses__():
-        ui = check_implementation(ui_class, bot=bot, config=config)
-        bot.add_view(ui.view(timeout=None), message_id=ui.message)
+    bot.plugins.register_all_views()
+    bot.monitor.start()
+    CONFIG.on_change(on_config_change)
+    bot.loop.create_task(CONFIG.watch())
 
-# sync commands and start background tasks
+# start competing for leadership. once elected, commands are synced (only if they changed) and background tasks start.
+# on_ready fires again after reconnecting, but the election is only started once
 @bot.event
 async def on_ready():
-    await bot.tree.sync(guild=guild)
-    for task_class in BaseBackgroundTask.__subclasses__():
-        task = task_class(bot=bot, config=config)
-        task.action.start()
+    bot.leader.start()
     print('Ready!')
 
 # finally, run the bot
-with open('secrets/bot_key.json') as file:
-    key = json.load(file)['key']
-
-bot.run(key)
+bot.run(CONFIG.key.key)
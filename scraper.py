@@ -3,128 +3,100 @@ Due to hosting limitations, the scraper must be ran as a manual script.
 '''
 import discord
 import asyncio
-import json
-import re
+import argparse
+from functools import partial
 from discord.ext import commands
-from scraper_tools.web import scrape, EventData, SCRAPER_CONFIG
-from source.tools.ui_helper import generate_embed
-
-with open('secrets/config.json') as file:
-    channel_id = json.load(file)['scraper_channel']
-
-# set up colors for each query
-color_keys = {
-    query['search']: int(query['embed_color'], base=16)
-    for query in SCRAPER_CONFIG['queries']
-}
-default_color = int(SCRAPER_CONFIG['default_embed_color'], base=16)
+from scraper_tools.web import scrape
+from source.tools.ui_helper import EmbedTemplate, message_groups
+from source.tools.jobs import Job, Digest
+from source.tools.shared_features import DIGESTS, JOBS
+from source.persistent_ui import JobDigest
+from source.tools.leader import LeaderElection, SQLiteLease
+from source.tools.config import CONFIG
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--resume', action='store_true', help='continue the last scrape, skipping the queries it finished')
+args = parser.parse_args()
+
+CONFIG.load('bot', 'key', 'scraper') # fail early if any config is invalid
+
+# set up an embed color and template for each query
+colors = {query.search: int(query.embed_color, base=16) for query in CONFIG.scraper.queries}
+default_color = int(CONFIG.scraper.default_embed_color, base=16)
+templates = {search: EmbedTemplate({'color': color}) for search, color in colors.items()}
+default_template = EmbedTemplate({'color': default_color})
 
 # define relevant functions
-def parse_insights(insights: list[str]) -> list[dict]:
-    '''
-    Given an insight from LinkedIn, parse it into a fields list.
-
-    The logic here isn't pretty. I won't try to defend it; this is just an amalgamation of multiple months of code.
-    '''
-    fields = []
-
-    # first parse salary and job type
-    salary_and_job = insights[0].split(' · ', 1)
-    for item in salary_and_job: # sometimes there is no identifiable delimiter, so a for-loop is necessary
-        if '$' in item:
-            # the purpose of check_list is to handle something like 
-            # $82,600/yr - $153,100/yr (from job description) On-site Full-time Entry level
-            # i.e. improper delimiter.
-            # first, split (from job description). if the list isn't a singleton, then we're in the above case.
-            check_list = item.split('(from job description)') 
-            if len(check_list) > 1:
-                fields.append({
-                    'name': 'Salary',
-                    'value': check_list[0].strip()
-                })
-                fields.append({
-                    'name': 'Job Type',
-                    'value': check_list[1].strip()
-                })
-                break
-
-            fields.append({
-                'name': 'Salary',
-                'value': item.replace(' (from job description)', '') # remove the "from job desc" bit
-            })
-        else:
-            fields.append({
-                'name': 'Job Type',
-                'value': item
-            })
-
-    # next, parse size and industry
-    size_and_industry = insights[1].split(' · ', 1) # this can be of varying sizes, so a for-loop is necessary
-    for item in size_and_industry:
-        if 'employee' in item:
-            fields.append({
-                'name': 'Size',
-                'value': item
-            })
-        else:
-            fields.append({
-                'name': 'Industry',
-                'value': item
-            })
-
-    # finally, parse remaining information that might not always be present
-    for insight in insights[2:]:
-        if 'alum' in insight:
-            fields.append({
-                'name': 'Alumni',
-                'value': insight
-            })
-        elif 'Skills' in insight:
-            fields.append({
-                'name': 'Skills',
-                'value': insight[8:] # skips 'Skills: '
-            })
-
-    return fields
+def parse_jobs(events: list) -> list[Job]:
+    jobs = []
+    for event in events:
+        try:
+            jobs.append(Job.from_event(event))
+        except Exception as e:
+            print(event.insights, e, sep='\n')
+    return jobs
 
-async def send_messages(channel: discord.TextChannel, jobs: list[EventData], /):
+async def send_messages(channel: discord.TextChannel, jobs: list[Job], /):
     for job in jobs:
         try:
-            embed = generate_embed({
-                'author': {
-                    'name': job.company,
-                    'url': job.company_link,
-                    'icon_url': job.company_img_link
-                },
-                'color': color_keys.get(job.query, default_color),
-                'title': ' '.join(re.sub(r'\([^)]*\)|[\-\|\/\\](.*)', '', job.title).split()), # regex removes everything between parentheses, and everything after -|/\
-                'fields': [{
-                    'name': 'Location',
-                    'value': job.place
-                }] + parse_insights(job.insights),
-                'url': job.link
-            })
+            embeds = templates.get(job.query, default_template).render(job.embed_values())
 
             view = None
-            if job.apply_link: # if it's not empty
+            if job.apply_link:
                 view = discord.ui.View(timeout=None).add_item(discord.ui.Button(label='Apply', url=job.apply_link))
 
-            await channel.send(embed=embed, view=view)
+            # a job too long for one message continues in the next, with the apply button on the last
+            groups = message_groups(embeds)
+            for i, group in enumerate(groups):
+                await channel.send(embeds=group, view=view if i == len(groups) - 1 else None)
             await asyncio.sleep(0.5)
         except Exception as e:
-            print(job.insights, e, sep='\n')
+            print(job.title, e, sep='\n')
+
+async def send_digests(channel: discord.TextChannel, jobs: list[Job], /):
+    '''
+    Send one paginated digest per query, instead of a message per job.
+    The bot serves the digests' buttons, see `JobDigest` in `source/persistent_ui.py`.
+    '''
+    by_query: dict[str, list[Job]] = {}
+    for job in jobs:
+        by_query.setdefault(job.query, []).append(job)
+
+    view = JobDigest(bot=bot, config=CONFIG.bot, guild_id=channel.guild.id).view(timeout=None)
+    for query, query_jobs in by_query.items():
+        digest = Digest(query=query, jobs=query_jobs, color=colors.get(query, default_color))
+        message = await channel.send(embeds=digest.embeds(), view=view)
+        DIGESTS.save(message.id, digest)
 
 # prepare the bot
-bot = commands.Bot(command_prefix='$', intents=discord.Intents.all(), help_command=None)
+bot = commands.Bot(command_prefix='$', intents=discord.Intents(guilds=True), member_cache_flags=discord.MemberCacheFlags.none(), help_command=None) # only sends messages
+
+# only one scrape runs at a time, even if the script is started twice
+election = LeaderElection(SQLiteLease(name='scraper'), duration=CONFIG.bot.leader_lease)
 
 @bot.event
 async def on_ready():
-    channel = await bot.fetch_channel(channel_id)
-    jobs = await bot.loop.run_in_executor(None, scrape)
-    await send_messages(channel, jobs)
+    election.start()
+    if not await election.wait_elected(timeout=CONFIG.bot.leader_lease * 2):
+        print('Another scrape is already running.')
+        await election.stop()
+        await bot.close()
+        return
+
+    channels = [
+        await bot.fetch_channel(guild.scraper_channel)
+        for guild in CONFIG.bot.guilds if guild.scraper_channel
+    ]
+    jobs = parse_jobs(await bot.loop.run_in_executor(None, partial(scrape, resume=args.resume)))
+    JOBS.add_many(jobs) # keep every job searchable with /jobs
+    for channel in channels:
+        if CONFIG.scraper.digest:
+            await send_digests(channel, jobs)
+        else:
+            await send_messages(channel, jobs)
+    DIGESTS.prune()
+    JOBS.compact()
+    await election.stop()
     await bot.close()
 
-with open('secrets/bot_key.json') as file:
-    key = json.load(file)['key']
-
-bot.run(key)
+bot.run(CONFIG.key.key)
@@ -0,0 +1,103 @@
+'''
+Resolves the external apply link of jobs, remembering them across scrapes.
+
+Signed in, the scraper clicks each job's apply button and waits for the new tab to find its
+link, which costs a navigation per job. Instead, the scraper runs without apply links, and
+they are read from LinkedIn's guest job page afterwards, once per job. Both found links and
+jobs without an external link are cached, so a job seen again costs nothing.
+'''
+import os
+import re
+import sqlite3
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from urllib.parse import urlparse, parse_qs
+from linkedin_jobs_scraper.events import EventData
+
+
+APPLY_LINK_PATH = 'data/apply_links.db'
+JOB_PAGE = 'https://www.linkedin.com/jobs-guest/jobs/api/jobPosting/{}'
+
+# the guest job page hides the apply link in a comment, as a LinkedIn redirect to the real link
+_APPLY_URL = re.compile(r'<code id="applyUrl"[^>]*>\s*<!--"(.+?)"-->')
+
+def resolve(job_id: str, session: requests.Session | None = None) -> str | None:
+    '''
+    Return the external apply link of a job, or None if it doesn't have one (it's applied to on LinkedIn).
+    Raises `requests.RequestException` if the page couldn't be fetched, since then it's unknown.
+    '''
+    response = (session or requests).get(JOB_PAGE.format(job_id), timeout=10)
+    response.raise_for_status()
+    match = _APPLY_URL.search(response.text)
+    if not match:
+        return None
+    link = match.group(1).replace('&amp;', '&')
+    return parse_qs(urlparse(link).query).get('url', [link])[0]
+
+class ApplyLinkCache:
+    '''
+    Apply links by job ID. A found link is kept for `ttl` seconds, and a job without one for `negative_ttl`.
+    '''
+    def __init__(self, path: str = APPLY_LINK_PATH, *, ttl: float = 30 * 86400, negative_ttl: float = 7 * 86400) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS apply_links (job_id TEXT PRIMARY KEY, link TEXT, resolved REAL NOT NULL)')
+
+    def get_many(self, job_ids: list[str]) -> dict[str, str | None]:
+        '''
+        Return the cached link (None if the job has none) of each job that's cached and hasn't expired.
+        '''
+        now, cached = time(), {}
+        for i in range(0, len(job_ids), 500): # stay under SQLite's limit on parameters
+            chunk = job_ids[i:i + 500]
+            rows = self._db.execute(f'SELECT job_id, link, resolved FROM apply_links WHERE job_id IN ({", ".join("?" * len(chunk))})', chunk)
+            for job_id, link, resolved in rows:
+                if now - resolved < (self.ttl if link else self.negative_ttl):
+                    cached[job_id] = link
+        return cached
+
+    def put_many(self, links: dict[str, str | None]) -> None:
+        with self._db:
+            self._db.executemany(
+                'INSERT INTO apply_links VALUES (?, ?, ?) ON CONFLICT (job_id) DO UPDATE SET link = excluded.link, resolved = excluded.resolved',
+                [(job_id, link, time()) for job_id, link in links.items()]
+            )
+
+    def prune(self) -> int:
+        '''
+        Delete expired entries. Returns the number deleted.
+        '''
+        now = time()
+        with self._db:
+            return self._db.execute(
+                'DELETE FROM apply_links WHERE (link IS NOT NULL AND resolved < ?) OR (link IS NULL AND resolved < ?)',
+                (now - self.ttl, now - self.negative_ttl)
+            ).rowcount
+
+def apply_links(items: list[EventData], cache: ApplyLinkCache, *, workers: int = 4) -> dict[str, str | None]:
+    '''
+    Return the apply link of each job in `items` (None if it has none), from `cache` or else resolved.\n
+    Links the scraper already found are cached as they are. A job whose page can't be fetched is left out, and isn't cached.
+    '''
+    found = {item.job_id: item.apply_link for item in items if item.apply_link}
+    cache.put_many(found)
+    links = cache.get_many(list({item.job_id for item in items} - found.keys()))
+    missing = list({item.job_id for item in items} - found.keys() - links.keys())
+
+    resolved = {}
+    session = requests.Session()
+    def attempt(job_id: str) -> None:
+        try:
+            resolved[job_id] = resolve(job_id, session)
+        except requests.RequestException as e:
+            print('[APPLY LINK]', job_id, e)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(attempt, missing))
+    cache.put_many(resolved)
+    print(f'[APPLY LINKS] {len(found) + len(links)} known, {len(resolved)} resolved, {len(missing) - len(resolved)} failed')
+    return found | links | resolved
@@ -1,52 +1,249 @@
-import json
 import os
-from time import sleep
+import json
+import hashlib
+import itertools
+import threading
+from copy import deepcopy
+from time import monotonic, sleep
 from linkedin_jobs_scraper import LinkedinScraper as Scraper
+from linkedin_jobs_scraper.config import Config
 from linkedin_jobs_scraper.events import Events, EventData
 from linkedin_jobs_scraper.query import Query, QueryFilters, QueryOptions
 from linkedin_jobs_scraper.filters import RelevanceFilters, TimeFilters, TypeFilters, ExperienceLevelFilters
+from linkedin_jobs_scraper.utils.chrome_driver import get_default_driver_options
+from selenium.webdriver.chrome.options import Options
+from source.tools.config import CONFIG, BrowserConfig
+from scraper_tools.apply_links import ApplyLinkCache, apply_links
+
 
-with open(r'secrets/scraper_config.json') as file:
-    SCRAPER_CONFIG = json.load(file)
-
-DEFAULT_QUERY = [
-    Query(
-        query=query['search'],
-        options=QueryOptions(
-            locations=query['locations'],
-            skip_promoted_jobs=query['skip_promoted'],
-            page_offset=query['pages_to_skip'],
-            limit=query['amount_to_scrape'],
-            apply_link=query['get_apply_link'],
-            filters=QueryFilters(
-                relevance=getattr(RelevanceFilters, query['relevance']),
-                time=getattr(TimeFilters, query['time']),
-                type=[getattr(TypeFilters, item) for item in query['type']],
-                experience=[getattr(ExperienceLevelFilters, item) for item in query['experience']]
+CHECKPOINT_DIRECTORY = 'data/scrape'
+PAGE_SIZE = 25 # jobs per results page when signed in
+
+def default_queries() -> list[Query]:
+    '''
+    Build the queries found in `secrets/scraper_config.json`.
+    This reads the config on each call, so edits to the file apply to the next scrape.
+    '''
+    return [
+        Query(
+            query=query.search,
+            options=QueryOptions(
+                locations=query.locations,
+                skip_promoted_jobs=query.skip_promoted,
+                page_offset=query.pages_to_skip,
+                limit=query.amount_to_scrape,
+                apply_link=query.get_apply_link,
+                filters=QueryFilters(
+                    relevance=getattr(RelevanceFilters, query.relevance),
+                    time=getattr(TimeFilters, query.time),
+                    type=[getattr(TypeFilters, item) for item in query.type],
+                    experience=[getattr(ExperienceLevelFilters, item) for item in query.experience]
+                )
             )
         )
+        for query in CONFIG.scraper.queries
+    ]
+
+def _split(queries: list[Query]) -> dict[str, Query]:
+    # one query per location, since the scraper's limit and paging apply to each location separately.
+    # each is keyed by a hash of its search, so a checkpoint is only resumed for the same search
+    units = {}
+    for query in queries:
+        for location in query.options.locations or ['Worldwide']:
+            unit = deepcopy(query)
+            unit.options.locations = [location]
+            if unit.options.limit is None:
+                unit.options.limit = 25
+            units[hashlib.sha1(str(unit).encode()).hexdigest()[:16]] = unit
+    return units
+
+# ---------------------------------------
+#              Checkpoint
+# ---------------------------------------
+class Checkpoint:
+    '''
+    Saves the progress of a scrape to `directory`, so an interrupted scrape can be resumed.\n
+    Each query's jobs are appended to `<key>.jsonl` as they're scraped, and `run.json`
+    holds each query's status: `'pending'`, `'running'`, `'done'` or `'failed'`.
+    '''
+    def __init__(self, directory: str = CHECKPOINT_DIRECTORY) -> None:
+        self.directory = directory
+        self.path = os.path.join(directory, 'run.json')
+        self.status: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, keys: list[str], *, resume: bool) -> None:
+        '''
+        Start tracking the given queries. With `resume`, the saved progress of any of them is kept, otherwise it's discarded.
+        '''
+        saved = {}
+        if resume:
+            try:
+                with open(self.path) as file:
+                    saved = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        else:
+            self.clear()
+        os.makedirs(self.directory, exist_ok=True)
+        self.status = {key: saved.get(key, 'pending') for key in keys}
+        for key in self.status:
+            if self.status[key] != 'done':
+                self.status[key] = 'pending'
+        self._save()
+
+    def mark(self, key: str, status: str) -> None:
+        with self._lock:
+            self.status[key] = status
+            self._save()
+
+    def append(self, key: str, item: EventData) -> None:
+        with self._lock, open(os.path.join(self.directory, f'{key}.jsonl'), 'a') as file:
+            file.write(json.dumps(item._asdict()) + '\n')
+
+    def items(self, key: str) -> list[EventData]:
+        try:
+            with open(os.path.join(self.directory, f'{key}.jsonl')) as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return []
+        items = []
+        for line in lines:
+            try:
+                items.append(EventData(**json.loads(line)))
+            except (json.JSONDecodeError, TypeError):
+                pass # a line cut off by a crash
+        return items
+
+    def clear(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name == 'run.json' or name.endswith('.jsonl') or name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _save(self) -> None:
+        with open(f'{self.path}.tmp', 'w') as file:
+            json.dump(self.status, file)
+        os.replace(f'{self.path}.tmp', self.path)
+
+# ---------------------------------------
+#               Scraping
+# ---------------------------------------
+def browser_options(browser: BrowserConfig, profile: str) -> Options | None:
+    '''
+    Chrome options for the lean profile in `browser`, using the profile directory named `profile`.
+    Returns None if `browser` isn't lean, so the scraper package's defaults are used.
+    '''
+    if not browser.lean:
+        return None
+    options = get_default_driver_options(headless=browser.headless)
+
+    # a profile directory can only be open in one Chrome at a time, so each worker has its own
+    directory = os.path.abspath(os.path.join(browser.profile_directory, profile))
+    os.makedirs(directory, exist_ok=True)
+    options.add_argument(f'--user-data-dir={directory}')
+    options.add_argument(f'--disk-cache-size={browser.cache_size}')
+
+    prefs = options.experimental_options['prefs']
+    if 'images' in browser.block:
+        prefs['profile.managed_default_content_settings.images'] = 2
+    if 'fonts' in browser.block:
+        options.add_argument('--disable-remote-fonts')
+    if 'media' in browser.block:
+        # video is only fetched once it plays
+        options.add_argument('--autoplay-policy=user-gesture-required')
+    if browser.blocked_domains:
+        # resolving these fails instantly, so the page never waits on them
+        rules = ', '.join(f'MAP {domain} ~NOTFOUND' for domain in browser.blocked_domains)
+        options.add_argument(f'--host-resolver-rules={rules}')
+
+    options.add_argument('--no-first-run')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-background-networking')
+    options.add_argument('--disable-component-update')
+    options.add_argument('--disable-sync')
+    return options
+
+def _make_scraper(worker: int) -> Scraper:
+    # each query gets its own scraper and Chrome instance, so one stuck query can be restarted on its own
+    browser = CONFIG.scraper.browser
+    return Scraper(
+        chrome_executable_path=CONFIG.scraper.chromedriver,
+        chrome_options=browser_options(browser, f'worker-{worker}'),
+        headless=browser.headless,
+        max_workers=1,
+        slow_mo=CONFIG.scraper.http_slow_down,  # Slow down (in seconds)
+        page_load_timeout=CONFIG.scraper.page_load_timeout
     )
-    for query in SCRAPER_CONFIG['queries']
-]
 
-class _StatusTracker:
+class _QueryRun:
     '''
-    To track the number of completed queries
+    Scrapes one query in a background thread, checkpointing each job as it arrives.\n
+    A run that is `abandoned` ignores anything its scraper still emits.
     '''
-    def __init__(self) -> None:
-        self.queries_finished = 0
-        
-    def done(self):
-        self.queries_finished += 1
-
-SCRAPER = Scraper(
-    chrome_executable_path=SCRAPER_CONFIG['chromedriver'], 
-    max_workers=SCRAPER_CONFIG['concurrent_chrome_instances'], 
-    slow_mo=SCRAPER_CONFIG['http_slow_down'],  # Slow down (in seconds)
-    page_load_timeout=SCRAPER_CONFIG['page_load_timeout']  
-)
-
-def scrape(query: Query | list[Query] = DEFAULT_QUERY) -> list[EventData]:
+    def __init__(self, key: str, query: Query, checkpoint: Checkpoint, worker: int) -> None:
+        self.key = key
+        self.worker = worker
+        self.checkpoint = checkpoint
+        self.seen = {item.job_id for item in checkpoint.items(key)}
+        self.query = self._remaining(query)
+        self.progress = monotonic()
+        self.finished = False
+        self.error: str | None = None
+        self.abandoned = False
+        self._thread = threading.Thread(target=self._run, name=f'scrape-{key}', daemon=True)
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def _remaining(self, query: Query) -> Query:
+        # signed in, the scraper can start at a later page, so whole pages already saved are skipped.
+        # otherwise it starts over, and jobs already saved are recognized by their ID
+        pages = len(self.seen) // PAGE_SIZE if Config.LI_AT_COOKIE else 0
+        if not pages:
+            return query
+        query = deepcopy(query)
+        query.options.page_offset = (query.options.page_offset or 0) + pages
+        query.options.limit -= pages * PAGE_SIZE
+        return query
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            scraper = _make_scraper(self.worker)
+            # the scraper only accepts plain functions as callbacks, not bound methods
+            scraper.on(Events.DATA, lambda data: self._on_data(data))
+            scraper.on(Events.ERROR, lambda error: self._on_error(error))
+            scraper.on(Events.END, lambda: self._on_end())
+            if self.query.options.limit > 0:
+                scraper.run(queries=self.query)
+        except Exception as e:
+            self._on_error(str(e))
+        self.finished = True
+
+    def _on_data(self, item: EventData) -> None:
+        if self.abandoned:
+            return
+        self.progress = monotonic()
+        if item.job_id in self.seen:
+            return
+        self.seen.add(item.job_id)
+        self.checkpoint.append(self.key, item)
+        print('[ON DATA]', item.title)
+
+    def _on_error(self, error: str) -> None:
+        if not self.abandoned:
+            self.error = error
+
+    def _on_end(self) -> None:
+        if not self.abandoned:
+            self.finished = True
+
+def scrape(query: Query | list[Query] = None, *, resume: bool = False) -> list[EventData]:
     '''
     Returns a list of EventData scraped from LinkedIn using the given query (or list of queries).
 
@@ -54,26 +251,70 @@ def scrape(query: Query | list[Query] = DEFAULT_QUERY) -> list[EventData]:
     It's advisable to run this in a background thread.
 
     If no query is provided, then the default query found in `secrets/scraper_config.json` is used.
+
+    Jobs are checkpointed to `data/scrape` as they're scraped. A query that makes no progress for
+    `watchdog_timeout` seconds, or fails, is restarted up to `max_restarts` times. With `resume`,
+    the queries an interrupted scrape already finished are skipped, and the rest continue from their checkpoint.
+
+    Apply links are looked up after scraping, and cached across scrapes (see `scraper_tools/apply_links.py`).
     '''
-    if isinstance(query, Query):
+    if query is None:
+        query = default_queries()
+    elif isinstance(query, Query):
         query = [query]
-    jobs = []
-    status = _StatusTracker()
-
-    def on_data(item: EventData):
-        print('[ON DATA]', item.title)
-        jobs.append(item)
+    units = _split(query)
+    # signed in, the scraper finds apply links with an extra navigation per job. they're resolved afterwards instead
+    with_links = {(unit.query, unit.options.locations[0]) for unit in units.values() if unit.options.apply_link}
+    for unit in units.values():
+        unit.options.apply_link = False
+    checkpoint = Checkpoint()
+    checkpoint.begin(list(units), resume=resume)
 
-    def on_end():
-        print('[END QUERY]', query[status.queries_finished].query)
-        status.done()
+    pending = [key for key, status in checkpoint.status.items() if status != 'done']
+    restarts = dict.fromkeys(pending, 0)
+    running: dict[str, _QueryRun] = {}
+    abandoned: list[_QueryRun] = []
+    while pending or running:
+        while pending and len(running) < CONFIG.scraper.concurrent_chrome_instances:
+            # an abandoned Chrome may still have its profile open, so it keeps its worker number until it exits
+            abandoned = [run for run in abandoned if run.alive]
+            busy = {run.worker for run in [*running.values(), *abandoned]}
+            key = pending.pop(0)
+            running[key] = _QueryRun(key, units[key], checkpoint, next(i for i in itertools.count() if i not in busy))
+            running[key].start()
+            checkpoint.mark(key, 'running')
 
-    SCRAPER.on(Events.DATA, on_data)
-    SCRAPER.on(Events.END, on_end)
-    SCRAPER.run(queries=query)
+        sleep(CONFIG.scraper.sleep_duration)
+        for key, run in list(running.items()):
+            stuck = monotonic() - run.progress > CONFIG.scraper.watchdog_timeout
+            if run.finished and not run.error:
+                print('[END QUERY]', run.query.query, run.query.options.locations[0])
+                checkpoint.mark(key, 'done')
+            elif run.finished or stuck:
+                # a stuck Chrome can't be killed from here, so it's left to its page load timeout
+                run.abandoned = True
+                abandoned.append(run)
+                reason = run.error.splitlines()[0] if run.error else f'no progress in {CONFIG.scraper.watchdog_timeout}s'
+                if restarts[key] < CONFIG.scraper.max_restarts:
+                    restarts[key] += 1
+                    print('[RESTART QUERY]', run.query.query, reason)
+                    pending.append(key)
+                else:
+                    print('[FAILED QUERY]', run.query.query, reason)
+                    checkpoint.mark(key, 'failed')
+            else:
+                continue
+            del running[key]
 
-    while status.queries_finished != len(query):
-        sleep(SCRAPER_CONFIG['sleep_duration'])
-    
+    jobs = [item for key in units for item in checkpoint.items(key)]
+    if with_links:
+        cache = ApplyLinkCache()
+        links = apply_links([item for item in jobs if (item.query, item.location) in with_links], cache)
+        jobs = [item._replace(apply_link=links[item.job_id] or '') if item.job_id in links else item for item in jobs]
+        cache.prune()
+    if all(status == 'done' for status in checkpoint.status.values()):
+        checkpoint.clear()
+    else:
+        print('[INCOMPLETE] run with --resume to retry the failed queries')
     print('[END SCRAPING]')
-    return jobs
\ No newline at end of file
+    return jobs
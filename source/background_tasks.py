@@ -1,6 +1,10 @@
 import discord
-from discord.ext import tasks, commands
-from abc import ABCMeta
+from discord.ext import commands
+from abc import ABCMeta, abstractmethod
+from source.tools.config import BotConfig
+from source.tools.scheduler import Interval, Cron
+from source.tools.shared_features import stall_embed, ROLE_COUNTS
+from source.tools.role_counts import managed_roles
 
 class BaseBackgroundTask(metaclass=ABCMeta):
     '''
@@ -9,16 +13,69 @@ class BaseBackgroundTask(metaclass=ABCMeta):
     as opposed to needing to be invoked by a user.
     ### Attributes (no setup required)
       `bot`: The `commands.Bot` instance of the bot.\n
-      `config`: The `json` config file containg relevant server information.
+      `config`: The `BotConfig` holding relevant server information (see `source/tools/config.py`).
+    ### Setup Optional
+      `schedule`: An `Interval` or `Cron` from `source/tools/scheduler.py`. Defaults to every 24 hours.\n
+      `policy`: `'catch_up'` to run once right away if a run was missed while the bot was offline,
+      or `'skip'` to wait for the next scheduled time. Defaults to `'catch_up'`.\n
+      `executor`: Where a non-async `action` runs, either `'thread'` or `'process'`. Defaults to `'thread'`.
+      A `'process'` action must be a `staticmethod`, since it's sent to another process.\n
+      `intents`: Names of intents the task needs, e.g. `('members',)`. Must be a literal (see `source/tools/intents.py`).
     ### Setup Required
-      `action`: The coroutine running in the background. See the docs for `discord.ext.tasks`.
-    Note that `action` behaves exactly like in the `Cog` examples in the `discord.py` docs.
+      `action`: The coroutine (or blocking function, see `executor`) to run on each scheduled time.
+    The time of the last run is saved, so restarting the bot doesn't reset the schedule.
     '''
-    def __init__(self, *, bot: commands.Bot, config: dict) -> None:
+    schedule: Interval | Cron = Interval(hours=24)
+    policy: str = 'catch_up'
+    executor: str = 'thread'
+
+    def __init__(self, *, bot: commands.Bot, config: BotConfig) -> None:
         self.bot = bot
         self.config = config
 
-    @tasks.loop(hours=24)
+    @abstractmethod
+    async def action(self):
+        '''
+        Must be implemented in subclass.
+        '''
+        pass
+
+class lag_report(BaseBackgroundTask):
+    '''
+    Post the times the event loop was blocked since the last report to each server's mod channel.
+    '''
+    schedule = Interval(minutes=5)
+    policy = 'skip'
+
+    async def action(self):
+        stalls = self.bot.monitor.unreported()
+        if not stalls:
+            return
+        embed = stall_embed(stalls)
+        for guild in self.config.guilds:
+            channel = self.bot.get_channel(guild.mod_channel) if guild.mod_channel else None
+            if channel:
+                await channel.send(embed=embed)
+
+class role_reconcile(BaseBackgroundTask):
+    '''
+    Count the self-assignable roles from a full member scan, correcting the running counts and recording them for trends.
+    '''
+    schedule = Interval(hours=6)
+    intents = ('members',) # listing members needs it
+
     async def action(self):
-        raise NotImplementedError(f'{self.__class__.__name__} failed to implement action.')
-    
\ No newline at end of file
+        for guild_config in self.config.guilds:
+            roles = managed_roles(guild_config).values()
+            guild = self.bot.get_guild(guild_config.server_id)
+            if not roles or guild is None:
+                continue
+            # fetched page by page rather than cached, so the bot doesn't keep every member in memory
+            members = {role_id: set() for role_id in roles}
+            async for member in guild.fetch_members(limit=None):
+                for role_id, user_ids in members.items():
+                    if member.get_role(role_id):
+                        user_ids.add(member.id)
+            drift = ROLE_COUNTS.reconcile(guild.id, members)
+            if any(drift.values()):
+                print(f'[ROLES] corrected counts in {guild.name}:', ', '.join(f'{role_id} {change:+}' for role_id, change in drift.items() if change))
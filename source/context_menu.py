@@ -4,6 +4,8 @@ from discord.ext.commands import Bot
 from discord import ui
 from discord.interactions import Interaction
 from source.tools.ui_helper import generate_embed, make_fail_embed
+from source.tools.config import BotConfig
+from source.tools.throttle import RateLimits, TokenRate
 
 
 class BaseContextMenu(metaclass=ABCMeta):
@@ -18,12 +20,18 @@ class BaseContextMenu(metaclass=ABCMeta):
     ### No Setup Required
       `name`: The name of the menu. Defaults to the name of the subclass.\n
       `bot`: The `commands.Bot` instance of the bot.\n
-      `config`: The `json` config file containg relevant server information.
+      `config`: The `BotConfig` holding relevant server information (see `source/tools/config.py`).
+    ### Setup Optional
+      `mod_only`: Whether only mods can use the menu (see `source/tools/plugin_loader.py`). Defaults to False.\n
+      `rate_limits`: A `RateLimits` throttling the menu (see `source/tools/throttle.py`). Defaults to None, for no limit.
     ### Setup Required
       `action`: The callback coroutine for when the command is invoked. Must be overridden.
       It's important for the `message_or_member` parameter to be properly typed.
     '''
-    def __init__(self, *, bot: Bot, config: dict) -> None:
+    mod_only: bool = False
+    rate_limits: RateLimits | None = None
+
+    def __init__(self, *, bot: Bot, config: BotConfig) -> None:
         self.bot = bot
         self.config = config
         self.name = getattr(self, 'name', self.__class__.__name__)
@@ -37,6 +45,8 @@ class BaseContextMenu(metaclass=ABCMeta):
 
 class message_edit(BaseContextMenu):
     name = 'edit'
+    mod_only = True
+    rate_limits = RateLimits(user=TokenRate(tokens=5, per=60))
 
     async def action(self, interaction: discord.Interaction, message: discord.Message,) -> None:
         # the following two sanity checks simply discern if the interaction can proceed
@@ -1,22 +1,30 @@
 import discord
 from discord.ext.commands import Bot
 from abc import ABCMeta, abstractmethod
-from source.tools.web_tools import check_member_status
+from source.tools.config import BotConfig
+from source.tools.shared_features import ROLE_COUNTS
+from source.tools.role_counts import managed_roles
 
 
 class BaseEvent(metaclass=ABCMeta):
     '''
     Base event class that all event listeners should inherit from.
     ### Attributes (No setup required)
-      `event`: The event to listen to (see discord.py docs). Defaults to name of subclass.\n
+      `event`: The event to listen to (see discord.py docs). Defaults to name of subclass.
+      Any number of subclasses may listen to the same event, so long as their class names differ.\n
+      `timeout`: Seconds the handler may run before it is cancelled. Defaults to 10.\n
       `bot`: The `commands.Bot` instance of the bot.\n
-      `config`: The `json` config file containg relevant server information.
+      `config`: The `BotConfig` holding relevant server information (see `source/tools/config.py`).
+    ### Setup Optional
+      `intents`: Names of intents the handler needs besides the one its event requires, e.g. `('message_content',)`.
+      Must be a literal, since intents are worked out before the plugin is imported (see `source/tools/intents.py`).
     ### Setup Required
       `action`: The callback coroutine for when the command is invoked. Must be overridden.
       
     '''
-    def __init__(self, *, bot: Bot, config: dict) -> None:
+    def __init__(self, *, bot: Bot, config: BotConfig) -> None:
         self.event = getattr(self, 'event', self.__class__.__name__)
+        self.timeout: float | None = getattr(self, 'timeout', 10.0)
         self.bot = bot
         self.config = config
 
@@ -27,14 +35,51 @@ class BaseEvent(metaclass=ABCMeta):
         '''
         pass
     
+# heavy dependencies (gspread) are only imported by the plugins that use them
+# from source.tools.web_tools import check_member_statuses
+# from source.tools.join_pipeline import JoinPipeline
+
 # class on_member_join(BaseEvent):
 #     '''
 #     Check if a new user is a member of DS UCSB.
+#     Joins are batched, since hundreds of people join at the start of each quarter.
 #     '''
-#     def __init__(self, *, bot: Bot, config: dict) -> None:
+#     def __init__(self, *, bot: Bot, config: BotConfig) -> None:
 #         super().__init__(bot=bot, config=config)
-#         self.member_role = discord.Object(config['verify_config']['role'])
+#         self.pipelines: dict[int, JoinPipeline] = {} # one per guild, since each has its own member role
     
 #     async def action(self, member: discord.Member):
-#         if check_member_status(member):
-#             await member.add_roles(self.member_role)
\ No newline at end of file
+#         guild_config = self.config.guild(member.guild.id)
+#         if guild_config is None or guild_config.verify_config is None:
+#             return
+#         if member.guild.id not in self.pipelines:
+#             self.pipelines[member.guild.id] = JoinPipeline(
+#                 resolve=check_member_statuses,
+#                 role=discord.Object(guild_config.verify_config.role)
+#             )
+#         self.pipelines[member.guild.id].submit(member)
+
+class role_count_update(BaseEvent):
+    '''
+    Keep the role counts up to date when a mod changes a member's self-assignable roles.
+    Discord only sends this for members the bot has cached, the rest are corrected by `role_reconcile`.
+    '''
+    event = 'on_member_update'
+
+    async def action(self, before: discord.Member, after: discord.Member):
+        roles = managed_roles(self.config.guild(after.guild.id)).values()
+        if roles and before.roles != after.roles:
+            ROLE_COUNTS.update(
+                after.guild.id, after.id,
+                added=[role_id for role_id in roles if after.get_role(role_id)],
+                removed=[role_id for role_id in roles if not after.get_role(role_id)]
+            )
+
+class role_count_leave(BaseEvent):
+    '''
+    Remove members who leave from the role counts.
+    '''
+    event = 'on_raw_member_remove'
+
+    async def action(self, payload: discord.RawMemberRemoveEvent):
+        ROLE_COUNTS.remove_member(payload.guild_id, payload.user.id)
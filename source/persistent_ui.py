@@ -4,8 +4,11 @@ from discord.ui import View
 from discord.ext.commands import Bot
 from source.tools.ui_helper import generate_embed
 from abc import ABCMeta, abstractmethod
-from source.tools.web_tools import check_member_status
-from source.tools.shared_features import SupportModal
+from source.tools.shared_features import SupportModal, DIGESTS, ROLE_COUNTS
+from source.tools.jobs import Digest
+from typing import Callable
+from source.tools.config import BotConfig, GuildConfig
+from source.tools.throttle import RateLimits, TokenRate
 
 
 class BasePersistentUI(metaclass=ABCMeta):
@@ -19,26 +22,46 @@ class BasePersistentUI(metaclass=ABCMeta):
     the library to attach a listener. See the comment under the
     `message` attribute.
 
+    One instance is created for each guild in the config.
+
     ## Attributes
     ### No Setup Required
       `bot`: The `commands.Bot` instance of the bot.\n
-      `config`: The `json` config file containg relevant server information.
+      `config`: The `BotConfig` holding relevant server information (see `source/tools/config.py`).\n
+      `guild_id`: The ID of the guild this instance belongs to.\n
+      `guild_config`: The `GuildConfig` of that guild.
+    ### Setup Optional
+      `enabled`: Whether to register the UI in this guild. Defaults to True.\n
+      `rate_limits`: A `RateLimits` throttling every component of the UI (see `source/tools/throttle.py`). Defaults to None, for no limit.
     ### Setup Required
       `message`: The ID of the message that the UI will attach itself to.
       **This must be an existing message with the UI already attached.**
-      Use an ad hoc script with empty callbacks to achieve this.\n
+      Use an ad hoc script with empty callbacks to achieve this.
+      May be None to attach to every message with the UI's custom ids.\n
       `view`: A `BaseView` object containing all UI objects. 
       **Note that every component MUST have a custom id.**
     '''
-    def __init__(self, *, bot: Bot, config: dict) -> None:
+    rate_limits: RateLimits | None = None
+
+    def __init__(self, *, bot: Bot, config: BotConfig, guild_id: int) -> None:
         self.bot = bot
         self.config = config
+        self.guild_id = guild_id
+
+    @property
+    def guild_config(self) -> GuildConfig:
+        # looked up each time, since reloading the config replaces the guild objects
+        return self.config.guild(self.guild_id)
+
+    @property
+    def enabled(self) -> bool:
+        return True
 
     @property
     @abstractmethod
-    def message(self) -> int:
+    def message(self) -> int | None:
         '''
-        Must be overridden and return an int of a message ID.
+        Must be overridden and return an int of a message ID (or None, see above).
         '''
         pass
     
@@ -50,17 +73,24 @@ class BasePersistentUI(metaclass=ABCMeta):
         '''
         pass
 
+# heavy dependencies (gspread) are only imported by the plugins that use them
+# from source.tools.web_tools import check_member_status
+
 # class Verify(BasePersistentUI):
 #     '''
 #     The verify button users can press to receive the member role.
 #     '''
-#     def __init__(self, *, bot: Bot, config: dict) -> None:
-#         super().__init__(bot=bot, config=config)
-#         self.member_role = discord.Object(config['verify_config']['role'])
+#     @property
+#     def enabled(self) -> bool:
+#         return self.guild_config.verify_config is not None
+
+#     @property
+#     def member_role(self) -> discord.Object:
+#         return discord.Object(self.guild_config.verify_config.role)
 
 #     @property
 #     def message(self) -> int:
-#         return self.config['verify_config']['message_id']
+#         return self.guild_config.verify_config.message_id
     
 #     @property
 #     def view(self) -> type[View]:
@@ -68,7 +98,7 @@ class BasePersistentUI(metaclass=ABCMeta):
 #             @ui.button(
 #                 label='Verify', 
 #                 style=ButtonStyle.blurple,
-#                 custom_id=f'verify-button-{self.config["server_id"]}'
+#                 custom_id=f'verify-button-{self.guild_id}'
 #             )
 #             async def verify(view_self, interaction: discord.Interaction, button: ui.Button):
 #                 await interaction.response.defer(ephemeral=True, thinking=True)
@@ -91,17 +121,24 @@ class ClassRoleMenu(BasePersistentUI):
     since `RoleMenu` displays every role in the server and can't be changed.
     
     To update existing roles, modify the 'class_roles_config' portion in the config file.
+    Changes are picked up without a restart.
     '''
-    def __init__(self, *, bot: Bot, config: dict) -> None:
-        super().__init__(bot=bot, config=config)
-        self.roles = {
+    rate_limits = RateLimits(user=TokenRate(tokens=3, per=60)) # each choice removes and adds roles
+
+    @property
+    def enabled(self) -> bool:
+        return self.guild_config.class_roles_config is not None
+
+    @property
+    def roles(self) -> dict[str, discord.Object]:
+        return {
             name: discord.Object(role_id)
-            for name, role_id in self.config['class_roles_config']['roles'].items()
+            for name, role_id in self.guild_config.class_roles_config.roles.items()
         }
 
     @property
     def message(self) -> int:
-        return self.config['class_roles_config']['message_id']
+        return self.guild_config.class_roles_config.message_id
     
     @property
     def view(self) -> type[View]:
@@ -112,13 +149,15 @@ class ClassRoleMenu(BasePersistentUI):
                     for name in self.roles
                 ],
                 placeholder='Choose your current class year!',
-                custom_id=f'role-menu-{self.config["server_id"]}'
+                custom_id=f'role-menu-{self.guild_id}'
             )
             async def select_role(view_self, interaction: discord.Interaction, menu: discord.ui.Select):
                 await interaction.response.defer(ephemeral=True, thinking=True) # sometimes it takes a while to remove roles
-                role = self.roles[menu.values[0]]
-                await interaction.user.remove_roles(*self.roles.values())
+                roles = self.roles
+                role = roles[menu.values[0]]
+                await interaction.user.remove_roles(*roles.values())
                 await interaction.user.add_roles(role)
+                ROLE_COUNTS.update(self.guild_id, interaction.user.id, added=[role.id], removed=[other.id for other in roles.values() if other.id != role.id])
                 await interaction.followup.send(f'Successfully gave you {menu.values[0]}', ephemeral=True)
 
         return RoleMenu
@@ -127,13 +166,19 @@ class AnnouncementButton(BasePersistentUI):
     '''
     A button giving a self-assignable role for announcements.
     '''
-    def __init__(self, *, bot: Bot, config: dict) -> None:
-        super().__init__(bot=bot, config=config)
-        self.role = discord.Object(self.config['announcement_role_config']['role'])
+    rate_limits = RateLimits(user=TokenRate(tokens=3, per=60))
+
+    @property
+    def enabled(self) -> bool:
+        return self.guild_config.announcement_role_config is not None
+
+    @property
+    def role(self) -> discord.Object:
+        return discord.Object(self.guild_config.announcement_role_config.role)
 
     @property
     def message(self) -> int:
-        return self.config['announcement_role_config']['message_id']
+        return self.guild_config.announcement_role_config.message_id
     
     @property
     def view(self) -> type[View]:
@@ -141,15 +186,17 @@ class AnnouncementButton(BasePersistentUI):
             @ui.button(
                 label='Opt In/Out',
                 style=ButtonStyle.red,
-                custom_id=f'announcement-button-{self.config["server_id"]}'
+                custom_id=f'announcement-button-{self.guild_id}'
             )
             async def give_announce_role(view_self, interaction: discord.Interaction, button: ui.Button):
-                member = interaction.user
-                if member.get_role(self.role.id):
-                    await member.remove_roles(self.role)
+                member, role = interaction.user, self.role
+                if member.get_role(role.id):
+                    await member.remove_roles(role)
+                    ROLE_COUNTS.update(self.guild_id, member.id, removed=[role.id])
                     await interaction.response.send_message('Successfully opted out of announcements.', ephemeral=True)
                 else:
-                    await member.add_roles(self.role)
+                    await member.add_roles(role)
+                    ROLE_COUNTS.update(self.guild_id, member.id, added=[role.id])
                     await interaction.response.send_message('Successfully opted into announcements.', ephemeral=True)
 
         return AnnounceView
@@ -158,9 +205,15 @@ class HelpButton(BasePersistentUI):
     '''
     A button prompting a support ticket.
     '''
+    rate_limits = RateLimits(user=TokenRate(tokens=2, per=300))
+
+    @property
+    def enabled(self) -> bool:
+        return self.guild_config.help_config is not None
+
     @property
     def message(self) -> int:
-        return self.config['help_config']['message_id']
+        return self.guild_config.help_config.message_id
     
     @property
     def view(self) -> type[View]:
@@ -168,10 +221,57 @@ class HelpButton(BasePersistentUI):
             @ui.button(
                 label='Help',
                 style=ButtonStyle.green,
-                custom_id=f'support-button-{self.config["server_id"]}'
+                custom_id=f'support-button-{self.guild_id}'
             )
             async def help_button(view_self, interaction: discord.Interaction, button):
-                channel = self.bot.get_channel(self.config['help_config']['channel'])
+                channel = self.bot.get_channel(self.guild_config.help_config.channel)
                 await interaction.response.send_modal(SupportModal(channel=channel))
 
-        return HelpView
\ No newline at end of file
+        return HelpView
+
+class JobDigest(BasePersistentUI):
+    '''
+    The page and filter buttons of the job digests sent by the scraper (see `scraper.py`).
+    Every run sends new digests, so this attaches to all of them rather than a single message.
+    '''
+    @property
+    def enabled(self) -> bool:
+        return self.guild_config.scraper_channel is not None
+
+    @property
+    def message(self) -> None:
+        return None
+
+    @property
+    def view(self) -> type[View]:
+        class DigestView(View):
+            async def update(view_self, interaction: discord.Interaction, change: Callable[[Digest], None]):
+                digest = DIGESTS.load(interaction.message.id)
+                if digest is None:
+                    await interaction.response.send_message('This digest is too old to browse.', ephemeral=True)
+                    return
+                change(digest)
+                DIGESTS.save_state(interaction.message.id, digest)
+                await interaction.response.edit_message(embeds=digest.embeds())
+
+            @ui.button(label='◀', style=ButtonStyle.gray, custom_id=f'digest-previous-{self.guild_id}')
+            async def previous(view_self, interaction: discord.Interaction, button: ui.Button):
+                await view_self.update(interaction, lambda digest: digest.turn(-1))
+
+            @ui.button(label='▶', style=ButtonStyle.gray, custom_id=f'digest-next-{self.guild_id}')
+            async def next(view_self, interaction: discord.Interaction, button: ui.Button):
+                await view_self.update(interaction, lambda digest: digest.turn(1))
+
+            @ui.button(label='Salary', style=ButtonStyle.blurple, custom_id=f'digest-salary-{self.guild_id}')
+            async def salary(view_self, interaction: discord.Interaction, button: ui.Button):
+                await view_self.update(interaction, lambda digest: digest.cycle('salary'))
+
+            @ui.button(label='Job Type', style=ButtonStyle.blurple, custom_id=f'digest-employment-{self.guild_id}')
+            async def employment(view_self, interaction: discord.Interaction, button: ui.Button):
+                await view_self.update(interaction, lambda digest: digest.cycle('employment'))
+
+            @ui.button(label='Location', style=ButtonStyle.blurple, custom_id=f'digest-location-{self.guild_id}')
+            async def location(view_self, interaction: discord.Interaction, button: ui.Button):
+                await view_self.update(interaction, lambda digest: digest.cycle('location'))
+
+        return DigestView
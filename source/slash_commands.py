@@ -1,11 +1,20 @@
 from abc import ABCMeta, abstractmethod
 import discord
 from discord import ui
-from discord.app_commands import describe, rename
+from discord.app_commands import describe, rename, choices, Choice
 from discord.ext.commands import Bot
 from discord.interactions import Interaction
 from source.tools.ui_helper import generate_embed, make_fail_embed
-from source.tools.shared_features import SupportModal, HelpInfo
+from source.tools.shared_features import SupportModal, HelpInfo, TICKETS, JOBS, ROLE_COUNTS, stall_embed, profile_embed
+from source.tools.role_counts import managed_roles
+from source.tools.jobs import EMPLOYMENT_TYPES, WORKPLACE_TYPES
+from source.tools.ticket_store import Ticket
+from source.tools.command_sync import sync_commands, sync_all_commands
+from source.tools.config import BotConfig
+from source.tools.memory import rss, cache_report
+from source.tools.throttle import RateLimits, TokenRate
+from source.tools.plugin_loader import is_mod
+from time import time, perf_counter
 
 
 class BaseCommand(metaclass=ABCMeta):
@@ -17,9 +26,10 @@ class BaseCommand(metaclass=ABCMeta):
     ### Configurable
       `name`: The name of the command. Defaults to what's given by `help_info`.\n
       `desc`: The description of the command. Defaults to what's given by `help_info`.\n
+      `rate_limits`: A `RateLimits` throttling the command (see `source/tools/throttle.py`). Defaults to None, for no limit.
     ### Unconfigurable
       `bot`: The `commands.Bot` instance of the bot.\n
-      `config`: The `json` config file containg relevant server information.
+      `config`: The `BotConfig` holding relevant server information (see `source/tools/config.py`).
     ## Methods
     ### Setup Optional
       `@classmethod help_info`: Returns a `HelpInfo` object detailing the settings of the command.
@@ -28,13 +38,14 @@ class BaseCommand(metaclass=ABCMeta):
       `action`: The callback coroutine for when the command is invoked. Must be overridden.
     '''
     _is_registered = False
+    rate_limits: RateLimits | None = None
 
-    def __init__(self, *, bot: Bot, config: dict) -> None:
+    def __init__(self, *, bot: Bot, config: BotConfig) -> None:
         hlp = self.help_info()
         self.name: str = getattr(self, 'name', hlp.name)
         self.desc: str = getattr(self, 'desc', hlp.desc)
         self.bot: Bot = bot
-        self.config: dict = config
+        self.config: BotConfig = config
 
     @abstractmethod
     async def action(self, interaction: discord.Interaction) -> None:
@@ -101,6 +112,8 @@ class message_send(BaseCommand):
     It was easier to design the `edit` portion as a context menu 
     command due to its place in Discord, and due to Discord limitations. 
     '''
+    rate_limits = RateLimits(user=TokenRate(tokens=5, per=60), command=TokenRate(tokens=20, per=60))
+
     @describe(
         content="The content of the message. Required if title and desc aren't given.",
         title="Title of the embed. Required if content isn't given.",
@@ -199,11 +212,285 @@ class message_send(BaseCommand):
     def help_info(cls) -> HelpInfo:
         return HelpInfo(name='send', desc='Send a message through the bot.', mod_only=True)
 
+class sync(BaseCommand):
+    '''
+    Force the bot to sync its slash commands with Discord, in the current server.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        await sync_commands(self.bot.tree, discord.Object(interaction.guild_id), force=True)
+        await interaction.followup.send('Synced commands.', ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='sync', desc='Force a sync of slash commands.', mod_only=True)
+
+class plugin_list(BaseCommand):
+    '''
+    List every plugin and how long it took to import.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        lines = []
+        for spec in self.bot.plugins.plugins.values():
+            import_time = f'{spec.import_time * 1000:.1f} ms' if spec.import_time is not None else 'not imported'
+            features = ', '.join(f'{len(classes)} {kind}' for kind, classes in spec.classes.items() if classes) or 'no features'
+            lines.append(f'`{spec.name}`: {import_time} ({features})')
+
+        await interaction.response.send_message('\n'.join(lines), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='list', desc='List plugins and their import times.', group='plugin', mod_only=True)
+
+class plugin_reload(BaseCommand):
+    '''
+    Reload a single plugin without restarting the bot.
+    '''
+    @describe(name='The name of the plugin, as shown by /plugin list.')
+    async def action(self, interaction: discord.Interaction, name: str) -> None:
+        if name not in self.bot.plugins.plugins:
+            await interaction.response.send_message(f"There's no plugin called `{name}`.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            import_time = self.bot.plugins.reload(name)
+        except Exception as e:
+            await interaction.followup.send(embed=make_fail_embed(title='ERROR', msg=f'Failed to reload `{name}`.', args={'error': repr(e)}), ephemeral=True)
+            return
+        synced = await sync_all_commands(self.bot.tree, self.bot.plugins.guilds)
+        await interaction.followup.send(
+            f'Reloaded `{name}` in {import_time * 1000:.1f} ms.' + (' Commands were synced.' if synced else ''),
+            ephemeral=True
+        )
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='reload', desc='Reload a plugin.', group='plugin', mod_only=True)
+
+class plugin(BaseGroup):
+    '''
+    Manage the bot's plugins.
+    '''
+    commands = [plugin_list, plugin_reload]
+
+class memory(BaseCommand):
+    '''
+    Show the bot's resident memory, how many objects of each type it caches, and its intents.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        report = cache_report(self.bot)
+        resident = rss()
+        intents = ', '.join(name for name, enabled in self.bot.intents if enabled)
+        await interaction.response.send_message(embed=generate_embed({
+            'title': 'Memory',
+            'description': f'Resident memory: {f"{resident / 2**20:.1f} MiB" if resident is not None else "unknown"}\nIntents: {intents}',
+            'color': 0x072c59,
+            'fields': [
+                {'name': name.capitalize(), 'value': f'{count:,}', 'inline': True}
+                for name, count in report.items()
+            ]
+        }), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='memory', desc="Report the bot's memory and cache sizes.", mod_only=True)
+
+class tasks(BaseCommand):
+    '''
+    Show when each background task last ran, how long it takes and when it runs next.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        fields = []
+        for state in self.bot.plugins.scheduler.tasks.values():
+            lines = [str(state.task.schedule), 'Running' if state.running else 'Stopped']
+            if state.next_run and state.running:
+                lines.append(f'Next run <t:{int(state.next_run)}:R>')
+            if state.last_run:
+                lines.append(f'Last run <t:{int(state.last_run)}:R>')
+            if state.history:
+                durations = [run.duration for run in state.history]
+                errors = sum(1 for run in state.history if run.error)
+                lines.append(f'{len(durations)} runs, mean {sum(durations) / len(durations):.2f}s, max {max(durations):.2f}s, {errors} failed')
+            fields.append({'name': state.name, 'value': '\n'.join(lines)})
+
+        await interaction.response.send_message(embed=generate_embed({
+            'title': 'Background Tasks',
+            'description': None if fields else 'No background tasks are running.',
+            'color': 0x072c59,
+            'fields': fields[:25]
+        }), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='tasks', desc='Show the schedule and timing of background tasks.', mod_only=True)
+
+class throttled(BaseCommand):
+    '''
+    Show how many interactions were throttled, by feature and the limit they hit.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        throttle = self.bot.plugins.throttle
+        counts = throttle.throttled.most_common(25) if throttle else []
+        await interaction.response.send_message(embed=generate_embed({
+            'title': 'Throttled Interactions',
+            'description': None if counts else 'Nothing has been throttled.',
+            'color': 0x072c59,
+            'fields': [{'name': feature, 'value': f'{count:,} ({scope} limit)', 'inline': True} for (feature, scope), count in counts]
+        }), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='throttled', desc='Show how often rate limited features were throttled.', mod_only=True)
+
+class profile_start(BaseCommand):
+    '''
+    Start sampling what the event loop is running.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        if self.bot.profiler.start():
+            await interaction.response.send_message('Started profiling. Use `/profile stop` to see the results.', ephemeral=True)
+        else:
+            await interaction.response.send_message('The profiler is already running.', ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='start', desc='Start the sampling profiler.', group='profile', mod_only=True)
+
+class profile_stop(BaseCommand):
+    '''
+    Stop the profiler, and post its results to the mod channel (or here, if there isn't one).
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        profiler = self.bot.profiler
+        if not profiler.running:
+            await interaction.response.send_message("The profiler isn't running.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        path = profiler.stop()
+        guild_config = self.config.guild(interaction.guild_id)
+        channel = self.bot.get_channel(guild_config.mod_channel) if guild_config and guild_config.mod_channel else None
+        if channel:
+            await channel.send(embed=profile_embed(profiler, path), file=discord.File(path))
+            await interaction.followup.send(f'Posted the results in {channel.mention}.', ephemeral=True)
+        else:
+            await interaction.followup.send(embed=profile_embed(profiler, path), file=discord.File(path), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='stop', desc='Stop the sampling profiler and post a flamegraph-ready profile.', group='profile', mod_only=True)
+
+class profile_lag(BaseCommand):
+    '''
+    Show the longest recent times the event loop was blocked.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        await interaction.response.send_message(embed=stall_embed(list(self.bot.monitor.stalls)), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='lag', desc='Show recent event loop stalls.', group='profile', mod_only=True)
+
+class profile(BaseGroup):
+    '''
+    Find what's slowing the bot down.
+    '''
+    commands = [profile_start, profile_stop, profile_lag]
+
+class roles_stats(BaseCommand):
+    '''
+    Show how many members have each self-assignable role, and how that changed.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        roles = managed_roles(self.config.guild(interaction.guild_id))
+        now, fields = time(), []
+        for name, role_id in roles.items():
+            count = ROLE_COUNTS.count(interaction.guild_id, role_id)
+            lines = [f'**{count:,}** members']
+            for label, days in (('week', 7), ('month', 30)):
+                past = ROLE_COUNTS.count_at(interaction.guild_id, role_id, now - days * 86400)
+                if past is not None:
+                    lines.append(f'{count - past:+,} this {label}')
+            history = [past for _, past in ROLE_COUNTS.history(interaction.guild_id, role_id, limit=20)]
+            if len(history) > 1:
+                lines.append(f'`{sparkline(history)}`')
+            fields.append({'name': name, 'value': '\n'.join(lines), 'inline': True})
+
+        await interaction.response.send_message(embed=generate_embed({
+            'title': 'Roles',
+            'description': None if fields else 'No self-assignable roles are set up in this server.',
+            'color': 0x072c59,
+            'fields': fields[:25],
+            'footer': {'text': 'Trends are recorded every 6 hours.'} if fields else None
+        }), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='stats', desc='Show role counts and trends.', group='roles', mod_only=True)
+
+class roles(BaseGroup):
+    '''
+    Self-assignable role statistics.
+    '''
+    commands = [roles_stats]
+
+def sparkline(values: list[int]) -> str:
+    # one block character per value, scaled between the smallest and largest
+    low, high = min(values), max(values)
+    blocks = '▁▂▃▄▅▆▇█'
+    return ''.join(blocks[(value - low) * (len(blocks) - 1) // (high - low) if high > low else 0] for value in values)
+
+class jobs(BaseCommand):
+    '''
+    Search every job the scraper has found.
+    '''
+    @describe(
+        keywords='Words to search for in the title, company and skills.',
+        company='Part of the company name.',
+        location='Part of the location, e.g. a city or state.',
+        job_type='The type of employment.',
+        workplace='Whether the job is remote, hybrid or on-site.',
+        min_salary='The least yearly salary, in dollars. Hides jobs without a salary.',
+        days='Only show jobs found in this many days. Defaults to 30.'
+    )
+    @choices(
+        job_type=[Choice(name=kind, value=kind) for kind in EMPLOYMENT_TYPES],
+        workplace=[Choice(name=kind, value=kind) for kind in WORKPLACE_TYPES]
+    )
+    async def action(self,
+        interaction: discord.Interaction,
+        keywords: str = None,
+        company: str = None,
+        location: str = None,
+        job_type: str = None,
+        workplace: str = None,
+        min_salary: int = None,
+        days: int = 30
+    ) -> None:
+        start = perf_counter()
+        results, total = JOBS.search(
+            keywords=keywords, company=company, location=location, employment=job_type,
+            workplace=workplace, min_salary=min_salary, since=time() - days * 86400
+        )
+        elapsed = perf_counter() - start
+
+        await interaction.response.send_message(embed=generate_embed({
+            'title': f'{total} jobs found',
+            'description': '\n\n'.join(job.line() for job in results) or 'No jobs match these filters.',
+            'color': 0x072c59,
+            'footer': {'text': f'Showing the newest {len(results)} · searched in {elapsed * 1000:.1f} ms'}
+        }), ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='jobs', desc='Search past job postings.')
+
 class help(BaseCommand):
     '''
     Returns list of slash commands.
     '''
-    def __init__(self, *, bot: Bot, config: dict) -> None:
+    def __init__(self, *, bot: Bot, config: BotConfig) -> None:
         super().__init__(bot=bot, config=config)
         
     async def action(self, interaction: Interaction) -> None:
@@ -216,7 +503,7 @@ class help(BaseCommand):
             # checks if the command is mod_only and skip it (unless interaction.user is a mod!)
             if getCmd.mod_only == False:
                 allCommandsTxt += getCmd.display() + "\n"
-            elif not (interaction.user.get_role(1132838403352830013) == None):
+            elif is_mod(interaction, self.config):
                 allCommandsTxt += getCmd.display() + "\n"
 
         await interaction.response.send_message(allCommandsTxt, ephemeral = True)
@@ -224,3 +511,75 @@ class help(BaseCommand):
     @classmethod
     def help_info(cls) -> HelpInfo:
         return HelpInfo(name='help', desc= 'Returns list of slash commands.')
+
+class ticket_search(BaseCommand):
+    '''
+    Search support tickets by title, explanation, user or status.
+    '''
+    @describe(query='Words to search for.')
+    async def action(self, interaction: discord.Interaction, query: str) -> None:
+        await interaction.response.send_message(
+            embed=ticket_embed(self.config, f'Tickets matching "{query}"', TICKETS.search(interaction.guild_id, query)),
+            ephemeral=True
+        )
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='search', desc='Search support tickets.', group='ticket', mod_only=True)
+
+class ticket_open(BaseCommand):
+    '''
+    List the oldest open support tickets.
+    '''
+    async def action(self, interaction: discord.Interaction) -> None:
+        await interaction.response.send_message(
+            embed=ticket_embed(self.config, 'Open Tickets', TICKETS.open_tickets(interaction.guild_id)),
+            ephemeral=True
+        )
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='open', desc='List open support tickets.', group='ticket', mod_only=True)
+
+class ticket_close(BaseCommand):
+    '''
+    Close a support ticket.
+    '''
+    @describe(number='The ticket number, shown in the footer of the ticket.')
+    async def action(self, interaction: discord.Interaction, number: int) -> None:
+        if TICKETS.close(interaction.guild_id, number):
+            await interaction.response.send_message(f'Closed ticket #{number}.', ephemeral=True)
+        else:
+            await interaction.response.send_message(f"Ticket #{number} doesn't exist or is already closed.", ephemeral=True)
+
+    @classmethod
+    def help_info(cls) -> HelpInfo:
+        return HelpInfo(name='close', desc='Close a support ticket.', group='ticket', mod_only=True)
+
+class ticket(BaseGroup):
+    '''
+    Manage support tickets.
+    '''
+    commands = [ticket_search, ticket_open, ticket_close]
+
+def ticket_embed(config: BotConfig, title: str, tickets: list[Ticket]) -> discord.Embed:
+    '''
+    Return an embed listing the given tickets, linking to their messages when possible.
+    '''
+    fields = []
+    for tckt in tickets[:25]: # embeds hold at most 25 fields
+        value = tckt.display()
+        guild_config = config.guild(tckt.guild_id)
+        if tckt.message_id and guild_config and guild_config.help_config:
+            value += f"\n[Jump to ticket](https://discord.com/channels/{tckt.guild_id}/{guild_config.help_config.channel}/{tckt.message_id})"
+        fields.append({
+            'name': tckt.title,
+            'value': value
+        })
+
+    return generate_embed({
+        'title': title,
+        'description': None if tickets else 'No tickets found.',
+        'color': 0x0ec940,
+        'fields': fields
+    })
@@ -0,0 +1,61 @@
+'''
+Syncs the command tree only when it has actually changed.
+
+`CommandTree.sync` bulk-overwrites every command and is heavily rate limited, so
+instead a hash of the serialized tree is persisted, and syncing is skipped if it matches.
+'''
+import os
+import json
+import discord
+from hashlib import sha256
+from discord import app_commands
+
+
+SYNC_STATE_PATH = 'data/command_sync.json'
+
+def tree_fingerprint(tree: app_commands.CommandTree, guild: discord.abc.Snowflake) -> str:
+    '''
+    Return a hash of every command, group and context menu registered to `guild`.
+    '''
+    payload = sorted(
+        (command.to_dict() for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    return sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def _load_state(path: str) -> dict[str, str]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_state(path: str, state: dict[str, str]) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write then rename, so another instance never reads a half written file
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(f'{path}.tmp', path)
+
+async def sync_commands(tree: app_commands.CommandTree, guild: discord.abc.Snowflake, *, force: bool = False, path: str = SYNC_STATE_PATH) -> bool:
+    '''
+    Sync the commands of `guild` if they changed since the last sync, or if `force` is given.
+    Returns whether a sync happened.
+    '''
+    fingerprint = tree_fingerprint(tree, guild)
+    state = _load_state(path)
+    if not force and state.get(str(guild.id)) == fingerprint:
+        return False
+
+    await tree.sync(guild=guild)
+    state = _load_state(path) # another instance may have written since
+    state[str(guild.id)] = fingerprint
+    _save_state(path, state)
+    return True
+
+async def sync_all_commands(tree: app_commands.CommandTree, guilds: list[discord.abc.Snowflake], *, force: bool = False, path: str = SYNC_STATE_PATH) -> list[discord.abc.Snowflake]:
+    '''
+    `sync_commands` for every guild in `guilds`. Returns the guilds that were synced.
+    '''
+    return [guild for guild in guilds if await sync_commands(tree, guild, force=force, path=path)]
@@ -0,0 +1,381 @@
+'''
+Typed access to every file in `secrets`.
+
+Each file is parsed once into slotted dataclasses and validated, instead of every
+component digging through raw dictionaries. The files are watched for changes, and
+reloaded values are written into the existing objects, so anything holding a config
+object sees the new values without a restart.
+'''
+import os
+import json
+import asyncio
+import traceback
+import types
+import typing
+from dataclasses import dataclass, field, fields, is_dataclass, KW_ONLY, MISSING
+from typing import Any, Callable
+
+
+class ConfigError(ValueError):
+    '''
+    Raised when a config file is missing a key, or a value has the wrong type.
+    '''
+    pass
+
+# ---------------------------------------
+#             secrets/config.json
+# ---------------------------------------
+@dataclass(slots=True)
+class HelpConfig:
+    _: KW_ONLY
+    channel: int
+    message_id: int
+
+@dataclass(slots=True)
+class ClassRolesConfig:
+    _: KW_ONLY
+    roles: dict[str, int]
+    message_id: int
+
+@dataclass(slots=True)
+class RoleMessageConfig:
+    _: KW_ONLY
+    role: int
+    message_id: int
+
+@dataclass(slots=True)
+class GuildConfig:
+    '''
+    The settings of a single server. Features whose section is missing are disabled in that server.\n
+    Members with `mod_role` can use mod only features, as can members who can manage the server.
+    '''
+    _: KW_ONLY
+    server_id: int
+    mod_role: int | None = None
+    scraper_channel: int | None = None
+    mod_channel: int | None = None
+    help_config: HelpConfig | None = None
+    class_roles_config: ClassRolesConfig | None = None
+    announcement_role_config: RoleMessageConfig | None = None
+    verify_config: RoleMessageConfig | None = None
+
+@dataclass(slots=True)
+class BotConfig:
+    '''
+    The server information in `secrets/config.json`.\n
+    The file holds either a list of `guilds`, or the settings of a single guild at the top level.
+    When moving to a list, put that guild first, since tickets stored before then are assigned to it.\n
+    `intents` names intents to enable on top of those the registered features need.\n
+    `lag_threshold` is how many seconds the event loop may be blocked before it's reported in each `mod_channel`.\n
+    `leader_lease` is how many seconds the leader's lease lasts when several instances run (see `source/tools/leader.py`).
+    '''
+    _: KW_ONLY
+    guilds: list[GuildConfig]
+    sharded: bool = False
+    shard_count: int | None = None
+    intents: list[str] = field(default_factory=list)
+    lag_threshold: float = 0.25
+    leader_lease: float = 3.0
+
+    def __post_init__(self) -> None:
+        if not self.guilds:
+            raise ConfigError('at least one guild is required')
+        ids = [guild.server_id for guild in self.guilds]
+        if len(ids) != len(set(ids)):
+            raise ConfigError('a server_id is listed more than once')
+
+    @property
+    def guild_ids(self) -> list[int]:
+        return [guild.server_id for guild in self.guilds]
+
+    def guild(self, guild_id: int | None) -> GuildConfig | None:
+        '''
+        Return the settings of a server, or None if the bot isn't configured for it.
+        '''
+        for guild in self.guilds:
+            if guild.server_id == guild_id:
+                return guild
+        return None
+
+# the mod role of the original server, whose config.json didn't name one
+ORIGINAL_MOD_ROLE = 1132838403352830013
+
+def _normalize_bot(data: Any) -> Any:
+    # a single guild at the top level is the original format of config.json
+    if isinstance(data, dict) and 'guilds' not in data:
+        return {'guilds': [{'mod_role': ORIGINAL_MOD_ROLE, **data}]}
+    return data
+
+@dataclass(slots=True)
+class KeyConfig:
+    '''
+    The bot token in `secrets/bot_key.json`.
+    '''
+    _: KW_ONLY
+    key: str
+
+# ---------------------------------------
+#         secrets/scraper_config.json
+# ---------------------------------------
+def _check_color(color: str) -> None:
+    try:
+        int(color, base=16)
+    except ValueError:
+        raise ConfigError(f'{color!r} is not a hex color') from None
+
+@dataclass(slots=True)
+class ScraperQueryConfig:
+    _: KW_ONLY
+    search: str
+    locations: list[str]
+    skip_promoted: bool
+    pages_to_skip: int
+    amount_to_scrape: int
+    get_apply_link: bool
+    relevance: str
+    time: str
+    type: list[str]
+    experience: list[str]
+    embed_color: str
+
+    def __post_init__(self) -> None:
+        _check_color(self.embed_color)
+
+# resource types the lean profile can skip, and trackers it never connects to
+BROWSER_RESOURCES = ('images', 'fonts', 'media')
+DEFAULT_BLOCKED_DOMAINS = (
+    '*.doubleclick.net', '*.google-analytics.com', '*.googletagmanager.com', '*.demdex.net',
+    '*.scorecardresearch.com', 'snap.licdn.com', 'px.ads.linkedin.com', 'platform.linkedin.com'
+)
+
+@dataclass(slots=True)
+class BrowserConfig:
+    '''
+    How Chrome is set up for scraping.\n
+    With `lean`, pages are loaded without the resource types in `block`, hosts matching `blocked_domains`
+    (`*` wildcards allowed) are never connected to, and each worker reuses a profile under `profile_directory`,
+    so its disk cache stays warm between scrapes. Otherwise the scraper package's default profile is used.\n
+    `lean` is off by default, since blocking resources changes what pages load. `headless` matches the scraper package's default.
+    '''
+    _: KW_ONLY
+    lean: bool = False
+    headless: bool = True
+    block: list[str] = field(default_factory=lambda: list(BROWSER_RESOURCES))
+    blocked_domains: list[str] = field(default_factory=lambda: list(DEFAULT_BLOCKED_DOMAINS))
+    profile_directory: str = 'data/chrome'
+    cache_size: int = 256 * 1024 * 1024
+
+    def __post_init__(self) -> None:
+        for resource in self.block:
+            if resource not in BROWSER_RESOURCES:
+                raise ConfigError(f'{resource!r} is not one of {", ".join(BROWSER_RESOURCES)}')
+
+@dataclass(slots=True)
+class ScraperConfig:
+    '''
+    The LinkedIn scraper settings in `secrets/scraper_config.json`.\n
+    With `digest`, the jobs of each query are sent as one paginated message instead of a message each.\n
+    A query that scrapes nothing for `watchdog_timeout` seconds, or fails, is restarted up to `max_restarts` times.\n
+    `browser` is optional, see `BrowserConfig`.
+    '''
+    _: KW_ONLY
+    chromedriver: str
+    concurrent_chrome_instances: int
+    http_slow_down: float
+    page_load_timeout: float
+    sleep_duration: float
+    default_embed_color: str
+    queries: list[ScraperQueryConfig]
+    digest: bool = False
+    watchdog_timeout: float = 300
+    max_restarts: int = 2
+    browser: BrowserConfig = field(default_factory=BrowserConfig)
+
+    def __post_init__(self) -> None:
+        _check_color(self.default_embed_color)
+
+# ---------------------------------------
+#         secrets/sheets_config.json
+# ---------------------------------------
+@dataclass(slots=True)
+class SheetsConfig:
+    '''
+    The member roster settings in `secrets/sheets_config.json`.
+    '''
+    _: KW_ONLY
+    sheet_id: str
+    user_column: int
+    scopes: list[str]
+
+# ---------------------------------------
+#                Parsing
+# ---------------------------------------
+def _parse(tp: Any, value: Any, path: str) -> Any:
+    '''
+    Convert `value` to type `tp`, raising a `ConfigError` naming `path` if it doesn't fit.
+    '''
+    origin, args = typing.get_origin(tp), typing.get_args(tp)
+
+    if origin in (typing.Union, types.UnionType):
+        if value is None and type(None) in args:
+            return None
+        return _parse(next(arg for arg in args if arg is not type(None)), value, path)
+
+    if is_dataclass(tp):
+        if not isinstance(value, dict):
+            raise ConfigError(f'{path}: expected an object, got {type(value).__name__}')
+        hints = typing.get_type_hints(tp)
+        kwargs = {}
+        for item in fields(tp):
+            if item.name not in value:
+                if item.default is MISSING and item.default_factory is MISSING:
+                    raise ConfigError(f'{path}: missing key {item.name!r}')
+                continue
+            kwargs[item.name] = _parse(hints[item.name], value[item.name], f'{path}.{item.name}')
+        try:
+            return tp(**kwargs)
+        except ConfigError as e:
+            raise ConfigError(f'{path}: {e}') from None
+
+    if origin is list:
+        if not isinstance(value, list):
+            raise ConfigError(f'{path}: expected a list, got {type(value).__name__}')
+        return [_parse(args[0], item, f'{path}[{i}]') for i, item in enumerate(value)]
+
+    if origin is dict:
+        if not isinstance(value, dict):
+            raise ConfigError(f'{path}: expected an object, got {type(value).__name__}')
+        return {key: _parse(args[1], item, f'{path}.{key}') for key, item in value.items()}
+
+    # bool is a subclass of int, but a bool where an int is expected is always a mistake
+    if tp is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, tp) or (tp is int and isinstance(value, bool)):
+        raise ConfigError(f'{path}: expected {tp.__name__}, got {type(value).__name__}')
+    return value
+
+def _update(target: Any, source: Any) -> None:
+    # write the values of source into target, so existing references see them
+    for item in fields(target):
+        setattr(target, item.name, getattr(source, item.name))
+
+@dataclass
+class _ConfigFile:
+    _: KW_ONLY
+    filename: str
+    cls: type
+    normalize: Callable[[Any], Any] = None
+    value: Any = None
+    mtime: float = 0.0
+
+class ConfigService:
+    '''
+    Loads, validates and watches the config files in `directory`.
+
+    ## Attributes
+      `bot`: The `BotConfig` from `config.json`.\n
+      `key`: The `KeyConfig` from `bot_key.json`.\n
+      `scraper`: The `ScraperConfig` from `scraper_config.json`.\n
+      `sheets`: The `SheetsConfig` from `sheets_config.json`.
+    Each file is loaded the first time its attribute is accessed, unless loaded earlier by `load`.
+    '''
+    def __init__(self, directory: str = 'secrets') -> None:
+        self.directory = directory
+        self._files = {
+            'bot': _ConfigFile(filename='config.json', cls=BotConfig, normalize=_normalize_bot),
+            'key': _ConfigFile(filename='bot_key.json', cls=KeyConfig),
+            'scraper': _ConfigFile(filename='scraper_config.json', cls=ScraperConfig),
+            'sheets': _ConfigFile(filename='sheets_config.json', cls=SheetsConfig),
+        }
+        self._listeners: list[Callable[[str], Any]] = []
+
+    def _read(self, name: str) -> Any:
+        file = self._files[name]
+        path = os.path.join(self.directory, file.filename)
+        mtime = os.stat(path).st_mtime
+        with open(path) as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ConfigError(f'{file.filename}: {e}') from None
+        if file.normalize:
+            data = file.normalize(data)
+        value = _parse(file.cls, data, file.filename)
+        file.mtime = mtime
+        return value
+
+    def _get(self, name: str) -> Any:
+        file = self._files[name]
+        if file.value is None:
+            file.value = self._read(name)
+        return file.value
+
+    @property
+    def bot(self) -> BotConfig:
+        return self._get('bot')
+
+    @property
+    def key(self) -> KeyConfig:
+        return self._get('key')
+
+    @property
+    def scraper(self) -> ScraperConfig:
+        return self._get('scraper')
+
+    @property
+    def sheets(self) -> SheetsConfig:
+        return self._get('sheets')
+
+    def load(self, *names: str) -> None:
+        '''
+        Load and validate the given files (e.g. `'bot'`), raising a `ConfigError` on the first invalid one.
+        '''
+        for name in names:
+            self._get(name)
+
+    def on_change(self, callback: Callable[[str], Any]) -> None:
+        '''
+        Call `callback` with the name of a file (e.g. `'bot'`) after it is reloaded. May be a coroutine.
+        '''
+        self._listeners.append(callback)
+
+    async def reload(self, name: str) -> bool:
+        '''
+        Reload a file in place. An invalid file is reported and ignored, keeping the old values.
+        '''
+        file = self._files[name]
+        try:
+            value = self._read(name)
+        except (ConfigError, OSError) as e:
+            print(f'[CONFIG] ignoring invalid {file.filename}: {e}')
+            return False
+
+        _update(file.value, value)
+        print(f'[CONFIG] reloaded {file.filename}')
+        for callback in self._listeners:
+            try:
+                result = callback(name)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                traceback.print_exc()
+        return True
+
+    async def watch(self, interval: float = 5.0) -> None:
+        '''
+        Poll the loaded files forever, reloading whichever change.
+        '''
+        while True:
+            await asyncio.sleep(interval)
+            for name, file in self._files.items():
+                if file.value is None:
+                    continue
+                try:
+                    mtime = os.stat(os.path.join(self.directory, file.filename)).st_mtime
+                except OSError:
+                    continue
+                if mtime != file.mtime:
+                    file.mtime = mtime # don't retry an invalid file until it changes again
+                    await self.reload(name)
+
+CONFIG = ConfigService()
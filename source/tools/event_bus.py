@@ -0,0 +1,125 @@
+'''
+Dispatches Discord events to any number of `BaseEvent` handlers.
+
+`discord.py` only allows one `on_<event>` attribute per bot, so instead the bus
+registers a single listener per event and fans it out to every subscribed handler.
+'''
+import asyncio
+import traceback
+from time import perf_counter
+from dataclasses import dataclass, KW_ONLY
+from typing import Any, Callable, Coroutine
+
+
+@dataclass
+class HandlerStats:
+    '''
+    Timing metrics for a single handler.
+
+    # Attributes
+      `calls`: Number of times the handler was invoked.
+      `failures`: Number of times the handler raised an exception.
+      `timeouts`: Number of times the handler exceeded its timeout.
+      `total_time`: Total time spent in the handler, in seconds.
+      `max_time`: Longest single invocation, in seconds.
+    '''
+    _: KW_ONLY
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+@dataclass
+class _Handler:
+    _: KW_ONLY
+    name: str
+    callback: Callable[..., Coroutine]
+    timeout: float | None
+    stats: HandlerStats
+
+class EventBus:
+    '''
+    Holds the handlers for each event and runs them concurrently.\n
+    Each handler runs with its own timeout, and an exception (or timeout) in one
+    handler never stops the others from running.
+    '''
+    def __init__(self) -> None:
+        self._handlers: dict[str, list[_Handler]] = {}
+
+    @property
+    def events(self) -> list[str]:
+        return list(self._handlers)
+
+    def subscribe(self, event: str, callback: Callable[..., Coroutine], *, name: str = None, timeout: float | None = None) -> None:
+        '''
+        Subscribe `callback` to `event` (e.g. `on_member_join`).
+        `name` is used for metrics and logging, and defaults to the callback's qualified name.
+        '''
+        name = name or getattr(callback, '__qualname__', repr(callback))
+        self._handlers.setdefault(event, []).append(
+            _Handler(name=name, callback=callback, timeout=timeout, stats=HandlerStats())
+        )
+
+    def unsubscribe(self, event: str, name: str) -> None:
+        '''
+        Remove every handler called `name` from `event`.
+        '''
+        handlers = [handler for handler in self._handlers.get(event, []) if handler.name != name]
+        if handlers:
+            self._handlers[event] = handlers
+        else:
+            self._handlers.pop(event, None)
+
+    def listener(self, event: str) -> Callable[..., Coroutine]:
+        '''
+        Return a coroutine suitable for `Bot.add_listener` that dispatches `event`.
+        '''
+        async def dispatch(*args: Any, **kwargs: Any) -> None:
+            await self.dispatch(event, *args, **kwargs)
+
+        dispatch.__name__ = event
+        return dispatch
+
+    async def dispatch(self, event: str, *args: Any, **kwargs: Any) -> None:
+        handlers = self._handlers.get(event, [])
+        await asyncio.gather(*(self._run(event, handler, args, kwargs) for handler in handlers))
+
+    async def dispatch_to(self, event: str, name: str, *args: Any, **kwargs: Any) -> None:
+        '''
+        Dispatch `event` to only the handlers called `name`.
+        '''
+        handlers = [handler for handler in self._handlers.get(event, []) if handler.name == name]
+        await asyncio.gather(*(self._run(event, handler, args, kwargs) for handler in handlers))
+
+    async def _run(self, event: str, handler: _Handler, args: tuple, kwargs: dict) -> None:
+        start = perf_counter()
+        try:
+            await asyncio.wait_for(handler.callback(*args, **kwargs), timeout=handler.timeout)
+        except asyncio.TimeoutError:
+            handler.stats.timeouts += 1
+            print(f'[EVENT TIMEOUT] {handler.name} ({event}) exceeded {handler.timeout}s')
+        except Exception:
+            handler.stats.failures += 1
+            print(f'[EVENT ERROR] {handler.name} ({event})')
+            traceback.print_exc()
+        finally:
+            handler.stats.record(perf_counter() - start)
+
+    def stats(self) -> dict[str, dict[str, HandlerStats]]:
+        '''
+        Return the metrics of every handler, grouped by event.
+        '''
+        return {
+            event: {handler.name: handler.stats for handler in handlers}
+            for event, handlers in self._handlers.items()
+        }
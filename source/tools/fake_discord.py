@@ -0,0 +1,275 @@
+'''
+An offline stand-in for the parts of Discord that features talk to, for load testing handlers.
+
+Handlers receive fake interactions whose responses, channels, webhooks and members call into
+a `FakeHTTP`, which simulates API latency and per-route rate limits. Like discord.py, a rate
+limited request waits out the limit and is retried, so handlers never see a 429, but rate
+limited requests are counted along with every API call.
+'''
+import asyncio
+import itertools
+import discord
+from collections import Counter
+from dataclasses import dataclass, KW_ONLY
+from discord import app_commands
+from time import monotonic, perf_counter
+from typing import Any, Callable
+
+
+@dataclass
+class RateLimit:
+    '''
+    At most `limit` requests every `per` seconds, per bucket.
+    '''
+    _: KW_ONLY
+    limit: int
+    per: float
+
+    def scaled(self, factor: float) -> 'RateLimit':
+        return RateLimit(limit=max(1, round(self.limit * factor)), per=self.per)
+
+# similar to Discord's buckets. each route is limited separately per channel, webhook or guild.
+# interaction responses and followups aren't rate limited
+DEFAULT_LIMITS = {
+    'send_message': RateLimit(limit=5, per=5.0),
+    'get_webhooks': RateLimit(limit=5, per=1.0),
+    'create_webhook': RateLimit(limit=1, per=1.0),
+    'execute_webhook': RateLimit(limit=5, per=2.0),
+    'edit_webhook_message': RateLimit(limit=5, per=2.0),
+    'add_role': RateLimit(limit=10, per=1.0),
+    'remove_role': RateLimit(limit=10, per=1.0),
+}
+
+class FakeHTTP:
+    '''
+    Counts API calls, delaying each by `latency` seconds and enforcing `limits` as fixed windows.
+    `rate_limited` counts the requests that got at least one 429.
+    '''
+    def __init__(self, *, latency: float = 0.0, limits: dict[str, RateLimit] = DEFAULT_LIMITS) -> None:
+        self.latency = latency
+        self.limits = limits
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self._windows: dict[tuple[str, int], tuple[float, int]] = {}
+
+    async def request(self, route: str, bucket: int = 0) -> None:
+        limit, limited = self.limits.get(route), False
+        while limit:
+            now = monotonic()
+            start, count = self._windows.get((route, bucket), (now, 0))
+            if now - start >= limit.per:
+                start, count = now, 0
+            if count < limit.limit:
+                self._windows[(route, bucket)] = (start, count + 1)
+                break
+            if not limited: # a 429, retried after retry_after like discord.py does
+                limited = True
+                self.rate_limited[route] += 1
+            await asyncio.sleep(start + limit.per - now)
+
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+_ids = itertools.count(1_000_000)
+
+class FakeMember:
+    def __init__(self, *, http: FakeHTTP, guild: 'FakeGuild', name: str) -> None:
+        self.id = next(_ids)
+        self.name = self.display_name = name
+        self.display_avatar = f'https://cdn.discordapp.com/embed/avatars/{self.id % 5}.png'
+        self.mention = f'<@{self.id}>'
+        self.guild = guild
+        self.role_ids: set[int] = set()
+        self._http = http
+
+    @property
+    def roles(self) -> list[discord.Object]:
+        return [discord.Object(role_id) for role_id in self.role_ids]
+
+    def get_role(self, role_id: int) -> discord.Object | None:
+        return discord.Object(role_id) if role_id in self.role_ids else None
+
+    async def add_roles(self, *roles: discord.abc.Snowflake, reason: str | None = None) -> None:
+        for role in roles: # like discord.py, one request per role
+            await self._http.request('add_role', self.guild.id)
+            self.role_ids.add(role.id)
+
+    async def remove_roles(self, *roles: discord.abc.Snowflake, reason: str | None = None) -> None:
+        for role in roles:
+            await self._http.request('remove_role', self.guild.id)
+            self.role_ids.discard(role.id)
+
+@dataclass
+class FakeMessage:
+    _: KW_ONLY
+    id: int
+    channel: Any
+    content: str | None = None
+    embeds: list[discord.Embed]
+    view: discord.ui.View | None = None
+
+class FakeWebhook:
+    def __init__(self, *, http: FakeHTTP, channel: 'FakeChannel', name: str) -> None:
+        self.id = next(_ids)
+        self.name = name
+        self.channel = channel
+        self._http = http
+
+    async def send(self, content: str | None = None, *, username: str | None = None, avatar_url: Any = None, embed: discord.Embed | None = None) -> None:
+        await self._http.request('execute_webhook', self.id)
+
+    async def edit_message(self, message_id: int, *, content: str | None = None, embed: discord.Embed | None = None) -> None:
+        await self._http.request('edit_webhook_message', self.id)
+
+class FakeChannel:
+    def __init__(self, *, http: FakeHTTP, guild: 'FakeGuild', name: str) -> None:
+        self.id = next(_ids)
+        self.name = name
+        self.mention = f'<#{self.id}>'
+        self.guild = guild
+        self.messages: list[FakeMessage] = []
+        self._webhooks: list[FakeWebhook] = []
+        self._http = http
+
+    async def send(self, content: str | None = None, *, embed: discord.Embed | None = None, view: discord.ui.View | None = None) -> FakeMessage:
+        await self._http.request('send_message', self.id)
+        message = FakeMessage(id=next(_ids), channel=self, content=content, embeds=[embed] if embed else [], view=view)
+        self.messages.append(message)
+        return message
+
+    async def webhooks(self) -> list[FakeWebhook]:
+        await self._http.request('get_webhooks', self.id)
+        return list(self._webhooks)
+
+    async def create_webhook(self, *, name: str, reason: str | None = None) -> FakeWebhook:
+        await self._http.request('create_webhook', self.id)
+        webhook = FakeWebhook(http=self._http, channel=self, name=name)
+        self._webhooks.append(webhook)
+        return webhook
+
+class FakeGuild:
+    def __init__(self, *, http: FakeHTTP, guild_id: int, members: int, channels: int) -> None:
+        self.id = guild_id
+        self.members = [FakeMember(http=http, guild=self, name=f'member{i}') for i in range(members)]
+        self.channels = [FakeChannel(http=http, guild=self, name=f'channel{i}') for i in range(channels)]
+
+    def get_channel(self, channel_id: int) -> FakeChannel | None:
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+class FakeResponse:
+    def __init__(self, interaction: 'FakeInteraction') -> None:
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self) -> None:
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        self._interaction.acknowledged = perf_counter()
+        await self._interaction.client_http.request('interaction_response')
+
+    async def send_message(self, content: str | None = None, *, embed: discord.Embed | None = None, view: discord.ui.View | None = None, ephemeral: bool = False) -> None:
+        await self._respond()
+
+    async def defer(self, *, ephemeral: bool = False, thinking: bool = False) -> None:
+        await self._respond()
+
+    async def send_modal(self, modal: discord.ui.Modal) -> None:
+        await self._respond()
+
+    async def edit_message(self, **kwargs) -> None:
+        await self._respond()
+
+class FakeFollowup:
+    def __init__(self, interaction: 'FakeInteraction') -> None:
+        self._interaction = interaction
+
+    async def send(self, content: str | None = None, *, embed: discord.Embed | None = None, ephemeral: bool = False) -> None:
+        if not self._interaction.response.is_done():
+            raise RuntimeError('followups can only be sent once the interaction is responded to')
+        await self._interaction.client_http.request('followup')
+
+class FakeInteraction:
+    '''
+    An interaction from `user` in `channel`, on `message` if it came from a component. The user has `permissions` in the channel.\n
+    `created` and `acknowledged` are `perf_counter` times; `acknowledged` is None until the first response.
+    '''
+    def __init__(self, *, http: FakeHTTP, client: Any, guild: FakeGuild, channel: FakeChannel, user: FakeMember, message: FakeMessage | None = None, permissions: discord.Permissions = discord.Permissions.none()) -> None:
+        self.id = next(_ids)
+        self.client = client
+        self.client_http = http
+        self.guild, self.guild_id = guild, guild.id
+        self.channel, self.channel_id = channel, channel.id
+        self.user = user
+        self.message = message
+        self.permissions = permissions
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.created = perf_counter()
+        self.acknowledged: float | None = None
+
+class FakeDiscord:
+    '''
+    Fake guilds with members and channels, delivering interactions to handlers like the gateway would.
+
+    ## Attributes
+      `http`: The `FakeHTTP` counting API calls.\n
+      `guilds`: The `FakeGuild` for each of `guild_ids`.
+    '''
+    def __init__(self, *, client: Any = None, guild_ids: list[int], members: int = 100, channels: int = 10, latency: float = 0.0, limits: dict[str, RateLimit] = DEFAULT_LIMITS) -> None:
+        self.client = client
+        self.http = FakeHTTP(latency=latency, limits=limits)
+        self.guilds = {guild_id: FakeGuild(http=self.http, guild_id=guild_id, members=members, channels=channels) for guild_id in guild_ids}
+
+    def interaction(self, guild_id: int, *, user: FakeMember | None = None, channel: FakeChannel | None = None, message: FakeMessage | None = None, permissions: discord.Permissions = discord.Permissions.none()) -> FakeInteraction:
+        guild = self.guilds[guild_id]
+        return FakeInteraction(
+            http=self.http, client=self.client, guild=guild,
+            channel=channel or (message.channel if message else guild.channels[0]),
+            user=user or guild.members[0],
+            message=message,
+            permissions=permissions
+        )
+
+    async def dispatch(self, callback: Callable, interaction: FakeInteraction, *args, **kwargs) -> tuple[float | None, float]:
+        '''
+        Run a handler in its own task, like discord.py does.
+        Returns the seconds until the interaction was acknowledged (None if it never was), and until the handler finished.
+        '''
+        await asyncio.get_running_loop().create_task(callback(interaction, *args, **kwargs))
+        finished = perf_counter()
+        acknowledged = interaction.acknowledged - interaction.created if interaction.acknowledged else None
+        return acknowledged, finished - interaction.created
+
+    async def invoke(self, command: app_commands.Command, interaction: FakeInteraction, **kwargs) -> tuple[float | None, float]:
+        '''
+        Run a slash command with the given options, after its checks like discord.py does.
+        '''
+        async def callback(interaction: FakeInteraction) -> None:
+            try:
+                if await command._check_can_run(interaction):
+                    await command.callback(command.binding, interaction, **kwargs)
+            except app_commands.CheckFailure:
+                pass # discord.py hands it to the tree's error handler
+
+        return await self.dispatch(callback, interaction)
+
+    async def press(self, view: discord.ui.View, custom_id: str, interaction: FakeInteraction, *, values: list[str] | None = None) -> tuple[float | None, float]:
+        '''
+        Press the button (or choose `values` in the select menu) of `view` with the given custom ID.
+        '''
+        item = next(child for child in view.children if getattr(child, 'custom_id', None) == custom_id)
+
+        async def callback(interaction: FakeInteraction) -> None:
+            if values is not None:
+                # what discord.py does with the interaction's data before calling the select's callback
+                item._refresh_state(interaction, {'values': values})
+            # discord.py 2.3 only checks the view, not the item
+            if await view.interaction_check(interaction):
+                await item.callback(interaction)
+
+        return await self.dispatch(callback, interaction)
@@ -0,0 +1,11 @@
+'''
+Helpers shared by the stores searched with SQLite's FTS5 (tickets and jobs).
+'''
+
+
+def match_expression(query: str) -> str:
+    '''
+    Turn what a user typed into an FTS5 `MATCH` expression, prefix matching each of its terms.
+    Every term is quoted, so user input can't break FTS5 syntax. Empty if there are no terms.
+    '''
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in query.split())
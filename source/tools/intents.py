@@ -0,0 +1,98 @@
+'''
+Works out the gateway intents and member cache the bot needs from its registered features.
+
+`Intents.all()` has Discord send every member and presence of every guild, all of which
+discord.py caches, even though most features never read them. Instead, the events that
+plugins listen to decide which intents are enabled. Any feature class may also declare
+intents it needs for other reasons, e.g. `intents = ('members',)` on a command reading
+`guild.members`.
+'''
+import discord
+from typing import Any, Iterable
+from source.tools.config import ConfigError
+
+
+# every bot needs the guilds intent, since channels and roles are cached from it
+BASE_INTENTS = ('guilds',)
+
+# the intent without which Discord never sends an event
+EVENT_INTENTS = {
+    'on_member_join': 'members',
+    'on_member_remove': 'members',
+    'on_raw_member_remove': 'members',
+    'on_member_update': 'members',
+    'on_user_update': 'members',
+    'on_presence_update': 'presences',
+    'on_message': 'messages',
+    'on_message_edit': 'messages',
+    'on_message_delete': 'messages',
+    'on_bulk_message_delete': 'messages',
+    'on_raw_message_edit': 'messages',
+    'on_raw_message_delete': 'messages',
+    'on_raw_bulk_message_delete': 'messages',
+    'on_reaction_add': 'reactions',
+    'on_reaction_remove': 'reactions',
+    'on_reaction_clear': 'reactions',
+    'on_raw_reaction_add': 'reactions',
+    'on_raw_reaction_remove': 'reactions',
+    'on_raw_reaction_clear': 'reactions',
+    'on_voice_state_update': 'voice_states',
+    'on_typing': 'typing',
+    'on_raw_typing': 'typing',
+    'on_guild_emojis_update': 'emojis_and_stickers',
+    'on_guild_stickers_update': 'emojis_and_stickers',
+    'on_invite_create': 'invites',
+    'on_invite_delete': 'invites',
+    'on_webhooks_update': 'webhooks',
+    'on_integration_create': 'integrations',
+    'on_integration_update': 'integrations',
+    'on_member_ban': 'moderation',
+    'on_member_unban': 'moderation',
+    'on_scheduled_event_create': 'guild_scheduled_events',
+    'on_scheduled_event_update': 'guild_scheduled_events',
+    'on_scheduled_event_delete': 'guild_scheduled_events',
+    'on_automod_action': 'auto_moderation_execution',
+}
+
+def _check(names: Iterable[str], source: str) -> set[str]:
+    names = set(names)
+    for name in names:
+        if name not in discord.Intents.VALID_FLAGS:
+            raise ConfigError(f'{source}: {name!r} is not an intent')
+    return names
+
+def plugin_intents(spec: Any) -> set[str]:
+    '''
+    Return the names of the intents a `PluginSpec` needs.
+    '''
+    names = {EVENT_INTENTS[event] for event in spec.events.values() if event in EVENT_INTENTS}
+    return names | _check(spec.intents, spec.name)
+
+def required_intents(plugins: Iterable[Any], extra: Iterable[str] = ()) -> discord.Intents:
+    '''
+    Return the intents needed by the given `PluginSpec`s, plus the intent names in `extra`.
+    '''
+    names = set(BASE_INTENTS) | _check(extra, 'config.json.intents')
+    for spec in plugins:
+        names |= plugin_intents(spec)
+    return discord.Intents(**{name: True for name in names})
+
+def missing_intents(spec: Any, intents: discord.Intents) -> set[str]:
+    '''
+    Return the intents a `PluginSpec` needs that aren't enabled. These only take effect after a restart.
+    '''
+    return {name for name in plugin_intents(spec) if not getattr(intents, name)}
+
+def client_options(plugins: Iterable[Any], extra: Iterable[str] = ()) -> dict[str, Any]:
+    '''
+    Return the intent and member cache keyword arguments to create the bot with.
+
+    Members are only cached if an intent delivers them, and guilds are never chunked
+    at startup, so members are cached lazily as they join or interact instead.
+    '''
+    intents = required_intents(plugins, extra)
+    return {
+        'intents': intents,
+        'member_cache_flags': discord.MemberCacheFlags.from_intents(intents),
+        'chunk_guilds_at_startup': False,
+    }
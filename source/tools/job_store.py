@@ -0,0 +1,163 @@
+'''
+Local SQLite warehouse of every job the scraper has found, so past postings can be searched.
+
+Jobs are ingested after each scrape, keyed by LinkedIn's job ID so a reposted job updates
+its row rather than duplicating it. Every common filter has an index, and titles, companies
+and skills have an FTS5 index, so searches are answered in milliseconds.
+'''
+import os
+import sqlite3
+from time import time
+from source.tools.jobs import Job, parse_salary
+from source.tools.fts import match_expression
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    query TEXT NOT NULL,
+    title TEXT NOT NULL,
+    company TEXT NOT NULL,
+    company_link TEXT,
+    place TEXT NOT NULL,
+    link TEXT NOT NULL,
+    apply_link TEXT,
+    salary TEXT,
+    salary_min REAL,
+    salary_max REAL,
+    job_type TEXT,
+    employment TEXT,
+    workplace TEXT,
+    size TEXT,
+    industry TEXT,
+    skills TEXT,
+    scraped REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_scraped ON jobs (scraped);
+CREATE INDEX IF NOT EXISTS jobs_employment ON jobs (employment, scraped);
+CREATE INDEX IF NOT EXISTS jobs_workplace ON jobs (workplace, scraped);
+CREATE INDEX IF NOT EXISTS jobs_query ON jobs (query, scraped);
+CREATE INDEX IF NOT EXISTS jobs_salary ON jobs (salary_max);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+    title, company, skills,
+    content='jobs', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS jobs_ai AFTER INSERT ON jobs BEGIN
+    INSERT INTO jobs_fts (rowid, title, company, skills)
+    VALUES (new.id, new.title, new.company, new.skills);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_ad AFTER DELETE ON jobs BEGIN
+    INSERT INTO jobs_fts (jobs_fts, rowid, title, company, skills)
+    VALUES ('delete', old.id, old.title, old.company, old.skills);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_au AFTER UPDATE OF title, company, skills ON jobs BEGIN
+    INSERT INTO jobs_fts (jobs_fts, rowid, title, company, skills)
+    VALUES ('delete', old.id, old.title, old.company, old.skills);
+    INSERT INTO jobs_fts (rowid, title, company, skills)
+    VALUES (new.id, new.title, new.company, new.skills);
+END;
+'''
+
+_COLUMNS = (
+    'key', 'query', 'title', 'company', 'company_link', 'place', 'link', 'apply_link',
+    'salary', 'salary_min', 'salary_max', 'job_type', 'employment', 'workplace', 'size', 'industry', 'skills', 'scraped'
+)
+
+def _row(job: Job, scraped: float) -> tuple:
+    salary_min, salary_max = parse_salary(job.salary)
+    return (
+        job.job_id or job.link, job.query, job.title, job.company, job.company_link, job.place, job.link, job.apply_link,
+        job.salary, salary_min, salary_max, job.job_type, job.employment, job.workplace,
+        job.field('Size'), job.field('Industry'), job.field('Skills'), scraped
+    )
+
+def _job(row: sqlite3.Row) -> Job:
+    fields = [
+        {'name': name, 'value': row[column]}
+        for name, column in (('Salary', 'salary'), ('Job Type', 'job_type'), ('Size', 'size'), ('Industry', 'industry'), ('Skills', 'skills'))
+        if row[column]
+    ]
+    return Job(
+        query=row['query'], title=row['title'], company=row['company'], company_link=row['company_link'], company_img_link=None,
+        place=row['place'], link=row['link'], apply_link=row['apply_link'], fields=fields, job_id=row['key']
+    )
+
+class JobStore:
+    '''
+    Stores scraped jobs and answers searches over them.
+
+    Jobs last seen more than `retention` seconds ago are deleted by `compact`.
+    '''
+    def __init__(self, path: str, *, retention: float = 180 * 86400) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.retention = retention
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+
+    def add_many(self, jobs: list[Job], *, scraped: float | None = None) -> int:
+        '''
+        Ingest the jobs of a scrape in one transaction. A job seen before is updated instead. Returns the number of rows written.
+        '''
+        scraped = time() if scraped is None else scraped
+        updates = ', '.join(f'{column} = excluded.{column}' for column in _COLUMNS[1:])
+        with self._db:
+            cursor = self._db.executemany(
+                f'''INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})
+                ON CONFLICT (key) DO UPDATE SET {updates}''',
+                [_row(job, scraped) for job in jobs]
+            )
+        return cursor.rowcount
+
+    def search(self, *,
+        keywords: str | None = None,
+        company: str | None = None,
+        location: str | None = None,
+        employment: str | None = None,
+        workplace: str | None = None,
+        min_salary: float | None = None,
+        since: float | None = None,
+        limit: int = 10
+    ) -> tuple[list[Job], int]:
+        '''
+        Return the newest jobs matching every given filter, and how many matched in total.\n
+        `keywords` are searched for in the title, company and skills, and `company` and `location` match substrings.
+        '''
+        joins, conditions, params = '', [], []
+        if keywords and match_expression(keywords):
+            joins = 'JOIN jobs_fts ON jobs_fts.rowid = jobs.id'
+            conditions.append('jobs_fts MATCH ?')
+            params.append(match_expression(keywords))
+        for column, value in (('company', company), ('place', location)):
+            if value:
+                conditions.append(f"jobs.{column} LIKE ? ESCAPE '\\'")
+                params.append('%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        for column, value in (('employment', employment), ('workplace', workplace)):
+            if value:
+                conditions.append(f'jobs.{column} = ?')
+                params.append(value)
+        if min_salary is not None:
+            conditions.append('jobs.salary_max >= ?')
+            params.append(min_salary)
+        if since is not None:
+            conditions.append('jobs.scraped >= ?')
+            params.append(since)
+
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        total = self._db.execute(f'SELECT count(*) FROM jobs {joins} {where}', params).fetchone()[0]
+        rows = self._db.execute(f'SELECT jobs.* FROM jobs {joins} {where} ORDER BY jobs.scraped DESC, jobs.id DESC LIMIT ?', (*params, limit))
+        return [_job(row) for row in rows], total
+
+    def compact(self) -> int:
+        '''
+        Delete jobs older than the retention period, then merge the search index and reclaim the space. Returns the number deleted.
+        '''
+        with self._db:
+            deleted = self._db.execute('DELETE FROM jobs WHERE scraped < ?', (time() - self.retention,)).rowcount
+            self._db.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('optimize')")
+        if deleted:
+            self._db.execute('VACUUM')
+        return deleted
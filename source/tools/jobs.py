@@ -0,0 +1,390 @@
+'''
+Normalizes the jobs the scraper finds, and groups the jobs of a run into paginated digests.
+
+This lives apart from `scraper.py` since the bot, which serves the digests' buttons, needs it too.
+'''
+import os
+import re
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, KW_ONLY
+from time import time
+from typing import Any
+import discord
+from source.tools.ui_helper import EmbedTemplate, message_groups, truncate
+
+
+def parse_insights(insights: list[str]) -> list[dict]:
+    '''
+    Given an insight from LinkedIn, parse it into a fields list.
+
+    The logic here isn't pretty. I won't try to defend it; this is just an amalgamation of multiple months of code.
+    '''
+    fields = []
+
+    # first parse salary and job type
+    salary_and_job = insights[0].split(' · ', 1)
+    for item in salary_and_job: # sometimes there is no identifiable delimiter, so a for-loop is necessary
+        if '$' in item:
+            # the purpose of check_list is to handle something like 
+            # $82,600/yr - $153,100/yr (from job description) On-site Full-time Entry level
+            # i.e. improper delimiter.
+            # first, split (from job description). if the list isn't a singleton, then we're in the above case.
+            check_list = item.split('(from job description)') 
+            if len(check_list) > 1:
+                fields.append({
+                    'name': 'Salary',
+                    'value': check_list[0].strip()
+                })
+                fields.append({
+                    'name': 'Job Type',
+                    'value': check_list[1].strip()
+                })
+                break
+
+            fields.append({
+                'name': 'Salary',
+                'value': item.replace(' (from job description)', '') # remove the "from job desc" bit
+            })
+        else:
+            fields.append({
+                'name': 'Job Type',
+                'value': item
+            })
+
+    # next, parse size and industry
+    size_and_industry = insights[1].split(' · ', 1) # this can be of varying sizes, so a for-loop is necessary
+    for item in size_and_industry:
+        if 'employee' in item:
+            fields.append({
+                'name': 'Size',
+                'value': item
+            })
+        else:
+            fields.append({
+                'name': 'Industry',
+                'value': item
+            })
+
+    # finally, parse remaining information that might not always be present
+    for insight in insights[2:]:
+        if 'alum' in insight:
+            fields.append({
+                'name': 'Alumni',
+                'value': insight
+            })
+        elif 'Skills' in insight:
+            fields.append({
+                'name': 'Skills',
+                'value': insight[8:] # skips 'Skills: '
+            })
+
+    return fields
+
+def clean_title(title: str) -> str:
+    # removes everything between parentheses, and everything after -|/\
+    return ' '.join(re.sub(r'\([^)]*\)|[\-\|\/\\](.*)', '', title).split())
+
+# hours and months in a working year, to compare hourly and monthly salaries with yearly ones
+_ANNUAL = {'yr': 1, 'year': 1, 'hr': 2080, 'hour': 2080, 'mo': 12, 'month': 12, 'wk': 52, 'week': 52}
+
+def parse_salary(salary: str | None) -> tuple[float | None, float | None]:
+    '''
+    Parse a salary like `$82,600/yr - $153,100/yr` or `$40K/yr` into a yearly (low, high) range.
+    Returns (None, None) if it can't be parsed.
+    '''
+    if not salary:
+        return None, None
+    amounts = [
+        float(number.replace(',', '')) * (1000 if suffix.upper() == 'K' else 1) * _ANNUAL.get(period.lower(), 1)
+        for number, suffix, period in re.findall(r'\$([\d,]+(?:\.\d+)?)\s*([kK]?)(?:\s*/\s*([a-zA-Z]+))?', salary)
+    ]
+    if not amounts:
+        return None, None
+    return min(amounts), max(amounts)
+
+EMPLOYMENT_TYPES = ('Full-time', 'Part-time', 'Contract', 'Temporary', 'Internship', 'Volunteer')
+WORKPLACE_TYPES = ('Remote', 'Hybrid', 'On-site')
+
+@dataclass
+class Job:
+    '''
+    A scraped job, with its insights parsed into embed fields.
+    '''
+    _: KW_ONLY
+    query: str
+    title: str
+    company: str
+    company_link: str | None
+    company_img_link: str | None
+    place: str
+    link: str
+    apply_link: str | None
+    fields: list[dict]
+    job_id: str | None = None
+
+    @classmethod
+    def from_event(cls, data: Any) -> 'Job':
+        '''
+        Create a job from the scraper's `EventData`.
+        '''
+        return cls(
+            query=data.query,
+            title=clean_title(data.title),
+            company=data.company,
+            company_link=data.company_link or None,
+            company_img_link=data.company_img_link or None,
+            place=data.place,
+            link=data.link,
+            apply_link=data.apply_link or None, # the scraper gives an empty string if there's none
+            fields=parse_insights(data.insights),
+            job_id=str(data.job_id) if getattr(data, 'job_id', None) else None
+        )
+
+    def field(self, name: str) -> str | None:
+        return next((item['value'] for item in self.fields if item['name'] == name), None)
+
+    @property
+    def salary(self) -> str | None:
+        return self.field('Salary')
+
+    @property
+    def job_type(self) -> str | None:
+        # insights without a salary are split into more than one job type field
+        return ' · '.join(item['value'] for item in self.fields if item['name'] == 'Job Type') or None
+
+    @property
+    def employment(self) -> str | None:
+        return next((kind for kind in EMPLOYMENT_TYPES if kind in (self.job_type or '')), None)
+
+    @property
+    def workplace(self) -> str | None:
+        return next((kind for kind in WORKPLACE_TYPES if kind in (self.job_type or '')), None)
+
+    def embed_values(self) -> dict:
+        '''
+        The values of a full embed for this job, for use with an `EmbedTemplate`.
+        '''
+        return {
+            'author': {
+                'name': self.company,
+                'url': self.company_link,
+                'icon_url': self.company_img_link
+            },
+            'title': self.title,
+            'fields': [{
+                'name': 'Location',
+                'value': self.place
+            }] + self.fields,
+            'url': self.link
+        }
+
+    def line(self, *, apply_link: bool = True) -> str:
+        # a compact summary for use in digests
+        details = ' · '.join(item for item in (self.place, self.salary, self.job_type) if item)
+        apply = f' · [Apply]({self.apply_link})' if self.apply_link and apply_link else ''
+        return f'**[{truncate(self.title, 80)}]({self.link})** at {self.company}\n{details}{apply}'
+
+# ---------------------------------------
+#                Digests
+# ---------------------------------------
+# each has a button stepping through its values
+FILTERS = ('salary', 'employment', 'location')
+
+# yearly salary ranges the salary filter steps through, as (label, low, high)
+SALARY_RANGES = (
+    ('Under $50K', 0, 50_000),
+    ('$50K-100K', 50_000, 100_000),
+    ('$100K-150K', 100_000, 150_000),
+    ('$150K+', 150_000, float('inf')),
+)
+
+def salary_ranges(salary: str | None) -> list[str]:
+    '''
+    The labels of the `SALARY_RANGES` a salary overlaps, e.g. `$82,600/yr - $153,100/yr` is in the last three.
+    '''
+    low, high = parse_salary(salary)
+    if low is None:
+        return []
+    return [label for label, start, end in SALARY_RANGES if low < end and high >= start]
+
+class Digest:
+    '''
+    The jobs a single query found in a run, shown a page at a time and filtered by salary range
+    (see `SALARY_RANGES`), job type or location. The jobs are indexed by each filter value when the digest is created,
+    so flipping through pages and filters never scans every job.
+    '''
+    page_size = 6
+
+    def __init__(self, *, query: str, jobs: list[Job], color: int, page: int = 0, filters: dict[str, str | None] | None = None) -> None:
+        self.query = query
+        self.jobs = jobs
+        self.color = color
+        self._template = EmbedTemplate({'color': color})
+
+        self.index: dict[str, dict[str, set[int]]] = {name: {} for name in FILTERS}
+        for i, job in enumerate(jobs):
+            for name, value in (
+                *(('salary', label) for label in salary_ranges(job.salary)),
+                ('employment', job.employment),
+                ('location', job.workplace),
+                ('location', job.place),
+            ):
+                if value:
+                    self.index[name].setdefault(value, set()).add(i)
+
+        self.restore(page=page, filters=filters)
+
+    def restore(self, *, page: int, filters: dict[str, str | None] | None) -> None:
+        '''
+        Set the page and filters, e.g. to those saved by another instance of the bot.
+        '''
+        self.page = page
+        # a saved filter value may no longer exist, e.g. the salary filter's values changed
+        self.filters = {name: value if value in self.index[name] else None for name, value in (filters or {}).items()} or {name: None for name in FILTERS}
+
+    def options(self, name: str) -> list[str]:
+        '''
+        The values a filter can take, most common first. Salary ranges are in order, and locations are limited
+        to the workplace types and the five most common places.
+        '''
+        values = sorted(self.index[name], key=lambda value: len(self.index[name][value]), reverse=True)
+        if name == 'salary':
+            values = [label for label, _, _ in SALARY_RANGES if label in self.index[name]]
+        if name == 'location':
+            values = [value for value in WORKPLACE_TYPES if value in self.index[name]] + [value for value in values if value not in WORKPLACE_TYPES][:5]
+        return values
+
+    def cycle(self, name: str) -> None:
+        '''
+        Step a filter to its next value, wrapping around to no filter.
+        '''
+        values = [None] + self.options(name)
+        current = self.filters[name]
+        self.filters[name] = values[(values.index(current) + 1) % len(values)] if current in values else None
+        self.page = 0
+
+    def matching(self) -> list[Job]:
+        selected = None
+        for name, value in self.filters.items():
+            if value is not None:
+                ids = self.index[name].get(value, set())
+                selected = ids if selected is None else selected & ids
+        if selected is None:
+            return self.jobs
+        return [self.jobs[i] for i in sorted(selected)]
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-len(self.matching()) // self.page_size))
+
+    def turn(self, step: int) -> None:
+        self.page = (self.page + step) % self.pages
+
+    def embeds(self) -> list[discord.Embed]:
+        '''
+        The embeds of the current page, which always fit in one message.
+        '''
+        jobs = self.matching()
+        self.page = min(self.page, self.pages - 1)
+        shown = jobs[self.page * self.page_size:(self.page + 1) * self.page_size]
+        filters = ', '.join(f'{name}: {value}' for name, value in self.filters.items() if value)
+        values = {
+            'title': f'{self.query}: {len(jobs)} jobs' if len(jobs) == len(self.jobs) else f'{self.query}: {len(jobs)} of {len(self.jobs)} jobs',
+            'description': '\n\n'.join(job.line() for job in shown) or 'No jobs match these filters.',
+            'footer': {'text': f'Page {self.page + 1}/{self.pages}' + (f' · {filters}' if filters else '')}
+        }
+        embeds = self._template.render(values)
+        if len(message_groups(embeds)) > 1:
+            # very long apply links can push a page past one message. each job's LinkedIn page still links to it
+            values['description'] = '\n\n'.join(job.line(apply_link=False) for job in shown)
+            embeds = self._template.render(values)
+        return embeds
+
+    def to_dict(self) -> dict:
+        return {
+            'query': self.query,
+            'color': self.color,
+            'page': self.page,
+            'filters': self.filters,
+            'jobs': [asdict(job) for job in self.jobs]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Digest':
+        return cls(query=data['query'], color=data['color'], page=data['page'], filters=data['filters'], jobs=[Job(**job) for job in data['jobs']])
+
+class DigestStore:
+    '''
+    Saves each digest under the ID of the message showing it, so its buttons work after a restart,
+    including in the bot process, which didn't post it. A digest's jobs are saved once, and its page
+    and filters separately, so a button press only writes those.
+
+    At most `max_cached` loaded digests are kept in memory, dropping the least recently used. Only
+    their jobs, which never change, are cached. The page and filters are read from disk on every
+    load, so instances of the bot sharing the directory continue from each other's presses.
+    '''
+    def __init__(self, directory: str, *, max_age: float = 30 * 86400, max_cached: int = 100) -> None:
+        self.directory = directory
+        self.max_age = max_age
+        self.max_cached = max_cached
+        self._digests: OrderedDict[int, Digest] = OrderedDict()
+
+    def _path(self, message_id: int, kind: str = 'json') -> str:
+        return os.path.join(self.directory, f'{message_id}.{kind}')
+
+    def _write(self, path: str, data: dict) -> None:
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(f'{path}.tmp', path)
+
+    def _cache(self, message_id: int, digest: Digest) -> None:
+        self._digests[message_id] = digest
+        self._digests.move_to_end(message_id)
+        if len(self._digests) > self.max_cached:
+            self._digests.popitem(last=False)
+
+    def save(self, message_id: int, digest: Digest) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._cache(message_id, digest)
+        self._write(self._path(message_id), digest.to_dict())
+
+    def save_state(self, message_id: int, digest: Digest) -> None:
+        '''
+        Save only the page and filters of a digest that was already saved.
+        '''
+        self._write(self._path(message_id, 'state'), {'page': digest.page, 'filters': digest.filters})
+
+    def load(self, message_id: int) -> Digest | None:
+        if message_id not in self._digests:
+            try:
+                with open(self._path(message_id)) as file:
+                    self._cache(message_id, Digest.from_dict(json.load(file)))
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+        digest = self._digests[message_id]
+        self._digests.move_to_end(message_id)
+        try:
+            with open(self._path(message_id, 'state')) as file:
+                digest.restore(**json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass # never browsed
+        return digest
+
+    def prune(self) -> int:
+        '''
+        Delete digests older than `max_age` seconds. Their buttons stop working. Returns how many were deleted.
+        '''
+        if not os.path.isdir(self.directory):
+            return 0
+        deleted = 0
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.endswith('.json') and time() - os.stat(path).st_mtime > self.max_age:
+                message_id = int(filename[:-5])
+                os.remove(path)
+                if os.path.exists(self._path(message_id, 'state')):
+                    os.remove(self._path(message_id, 'state'))
+                self._digests.pop(message_id, None)
+                deleted += 1
+        return deleted
@@ -0,0 +1,148 @@
+'''
+Batched processing of member joins.
+
+At the start of each quarter hundreds of people join within minutes. Rather than doing a
+roster lookup and a role edit per join, joins are queued, looked up against the roster in
+batches, and the role is handed out by a small pool of rate limited workers.
+
+Used by `on_member_join` in `source/events.py`, which stays disabled like it was before the
+pipeline, since it needs the members intent and the roster's Google Sheets credentials.
+'''
+import asyncio
+import traceback
+import discord
+from collections import deque
+from time import perf_counter
+from typing import Callable
+
+
+class _RateLimiter:
+    '''
+    Spaces calls out so no more than `rate` happen per second, across every worker.
+    '''
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = perf_counter()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class JoinPipeline:
+    '''
+    Queues new members, resolves their roster membership in batches and gives members a role.
+
+    ### Parameters
+      `resolve`: A synchronous function mapping a batch of members to whether each one is on the roster.
+      It is ran in the default executor, since the roster lookup may block.\n
+      `role`: The role given to members found on the roster.\n
+      `batch_size`: The most members resolved at once.\n
+      `batch_window`: Seconds to wait for a batch to fill up before resolving it anyway.\n
+      `workers`: Number of concurrent role edits.\n
+      `rate`: The most role edits per second, shared between every worker.\n
+      `max_latencies`: How many of the most recent latencies are kept.
+
+    ### Attributes
+      `granted`, `skipped`, `failed`: How many members were given the role, weren't on the roster, or couldn't be given it.\n
+      `latencies`: Seconds from submitting a member to giving them the role, for the most recent grants.
+    '''
+    def __init__(self, *,
+        resolve: Callable[[list[discord.Member]], list[bool]],
+        role: discord.abc.Snowflake,
+        batch_size: int = 50,
+        batch_window: float = 2.0,
+        workers: int = 4,
+        rate: float = 5.0,
+        max_latencies: int = 10_000
+    ) -> None:
+        self.resolve = resolve
+        self.role = role
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.workers = workers
+        self.latencies: deque[float] = deque(maxlen=max_latencies)
+        self.granted = 0
+        self.skipped = 0
+        self.failed = 0
+        self._limiter = _RateLimiter(rate)
+        self._joins: asyncio.Queue[tuple[discord.Member, float]] = asyncio.Queue()
+        self._grants: asyncio.Queue[tuple[discord.Member, float]] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        '''
+        Start the batcher and worker tasks. Does nothing if already started.
+        '''
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._batcher()))
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.workers))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def submit(self, member: discord.Member) -> None:
+        '''
+        Queue a member for processing. Starts the pipeline if it hasn't been already.
+        '''
+        self.start()
+        self._joins.put_nowait((member, perf_counter()))
+
+    async def drain(self) -> None:
+        '''
+        Wait until every submitted member has been fully processed.
+        '''
+        await self._joins.join()
+        await self._grants.join()
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._joins.get()]
+            # every dequeued member is marked done, even if the batcher is cancelled, so `drain` can't hang
+            try:
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(await asyncio.wait_for(self._joins.get(), timeout=deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+
+                try:
+                    results = await loop.run_in_executor(None, self.resolve, [member for member, _ in batch])
+                    if len(results) != len(batch):
+                        raise ValueError(f'resolve returned {len(results)} results for {len(batch)} members')
+                except Exception:
+                    traceback.print_exc()
+                    results = [False] * len(batch)
+
+                for item, on_roster in zip(batch, results):
+                    if on_roster:
+                        self._grants.put_nowait(item)
+                    else:
+                        self.skipped += 1
+            finally:
+                for _ in batch:
+                    self._joins.task_done()
+
+    async def _worker(self) -> None:
+        while True:
+            member, submitted = await self._grants.get()
+            try:
+                await self._limiter.wait()
+                await member.add_roles(self.role)
+                self.latencies.append(perf_counter() - submitted)
+                self.granted += 1
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+            finally:
+                self._grants.task_done()
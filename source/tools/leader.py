@@ -0,0 +1,169 @@
+'''
+Leader election, so several instances of the bot can run while only one does singleton work.
+
+Instances compete for a lease, which the holder renews well before it expires. When the leader
+dies its lease runs out, and another instance takes it over on its next attempt, so failover
+takes at most the lease duration plus the renewal interval. A leader that can't renew its lease
+steps down once the lease it last held would have expired, even if the backend is unreachable,
+so two instances never both believe they lead. The lease is renewed on its own, so slow
+`on_elected` work (e.g. syncing commands) can't hold it up; that work is cancelled if the
+instance is deposed before it finishes.
+
+The lease is kept by a `LeaseBackend`. `SQLiteLease` works for instances on the same machine;
+other backends (e.g. a database shared between machines) only need `acquire` and `release`.
+'''
+import os
+import socket
+import asyncio
+import sqlite3
+import traceback
+from abc import ABCMeta, abstractmethod
+from time import time
+from typing import Awaitable, Callable
+
+
+LEASE_PATH = 'data/leader.db'
+
+class LeaseBackend(metaclass=ABCMeta):
+    '''
+    Base class of the places a lease can be kept.
+    '''
+    @abstractmethod
+    def acquire(self, owner: str, duration: float) -> float | None:
+        '''
+        Take the lease for `duration` seconds if it's free or expired, or renew it if `owner` already holds it.
+        Returns the Unix time the lease expires, or None if someone else holds it.
+        '''
+        pass
+
+    @abstractmethod
+    def release(self, owner: str) -> None:
+        '''
+        Give up the lease if `owner` holds it, so another instance can take over right away.
+        '''
+        pass
+
+class SQLiteLease(LeaseBackend):
+    '''
+    A lease named `name` kept in an SQLite file, for instances sharing a file system.
+    '''
+    def __init__(self, path: str = LEASE_PATH, *, name: str = 'bot') -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.name = name
+        # autocommit, so each attempt is its own BEGIN IMMEDIATE transaction
+        self._db = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)')
+
+    def acquire(self, owner: str, duration: float) -> float | None:
+        # the write lock is taken before reading, so two instances can't both see the lease as free
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time()
+            row = self._db.execute('SELECT owner, expires FROM leases WHERE name = ?', (self.name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return None
+            self._db.execute('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)', (self.name, owner, now + duration))
+            return now + duration
+        finally:
+            self._db.execute('COMMIT')
+
+    def release(self, owner: str) -> None:
+        self._db.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (self.name, owner))
+
+class LeaderElection:
+    '''
+    Keeps trying to hold the lease of `backend`, calling `on_elected` when this instance becomes
+    the leader and `on_deposed` when it stops being the leader.
+
+    ## Attributes
+      `owner`: Identifies this instance. Defaults to the host name and process ID.\n
+      `duration`: Seconds a lease lasts. Renewed every `duration / 3` seconds.
+    '''
+    def __init__(self, backend: LeaseBackend, *,
+        duration: float = 3.0,
+        owner: str | None = None,
+        on_elected: Callable[[], Awaitable[None]] | None = None,
+        on_deposed: Callable[[], Awaitable[None]] | None = None
+    ) -> None:
+        self.backend = backend
+        self.duration = duration
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.expires = 0.0
+        self._leader = False
+        self._elected = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._callback: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        # also checked against the clock, in case the loop was too busy to notice the lease ran out
+        return self._leader and time() < self.expires
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name='leader-election')
+
+    async def stop(self) -> None:
+        '''
+        Stop competing, releasing the lease if this instance holds it.
+        '''
+        if self._task:
+            self._task.cancel()
+        if self._leader:
+            self._set_leader(False)
+            await asyncio.to_thread(self.backend.release, self.owner)
+        if self._callback:
+            await asyncio.wait([self._callback])
+
+    async def wait_elected(self, timeout: float | None = None) -> bool:
+        '''
+        Wait until this instance is the leader. Returns False if it isn't within `timeout` seconds.
+        '''
+        try:
+            await asyncio.wait_for(self._elected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # a blocking call, since SQLite may wait for another instance's transaction
+                expires = await asyncio.to_thread(self.backend.acquire, self.owner, self.duration)
+            except Exception:
+                traceback.print_exc()
+                expires = self.expires if time() < self.expires else None
+            if expires is not None:
+                self.expires = expires
+            if (expires is not None) != self._leader:
+                self._set_leader(expires is not None)
+            await asyncio.sleep(self.duration / 3)
+
+    def _set_leader(self, leader: bool) -> None:
+        self._leader = leader
+        print(f'[LEADER] {self.owner} {"elected" if leader else "deposed"}')
+        if leader:
+            self._elected.set()
+        else:
+            self._elected.clear()
+        # callbacks run in their own task, so they never delay renewing the lease.
+        # a callback still running is cancelled, so on_elected doesn't carry on after being deposed
+        previous = self._callback
+        if previous:
+            previous.cancel()
+        self._callback = asyncio.get_running_loop().create_task(
+            self._run_callback(previous, self.on_elected if leader else self.on_deposed),
+            name='leader-callback'
+        )
+
+    async def _run_callback(self, previous: asyncio.Task | None, callback: Callable[[], Awaitable[None]] | None) -> None:
+        if previous:
+            await asyncio.wait([previous]) # let the cancelled callback unwind first
+        if callback:
+            try:
+                await callback()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,43 @@
+'''
+Reports how much the bot is caching, to check that resident memory stays flat as guilds grow.
+'''
+import os
+import sys
+from discord.ext.commands import Bot
+
+
+def rss() -> int | None:
+    '''
+    Return the resident memory of the process in bytes, or None where it can't be read.
+    Falls back to the peak resident memory where `/proc` isn't available.
+    '''
+    if sys.platform == 'win32':
+        return None # the resource module is Unix only
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024 # macOS reports bytes, Linux kilobytes
+
+def cache_report(bot: Bot) -> dict[str, int]:
+    '''
+    Return the number of cached objects of each type.
+    '''
+    guilds = bot.guilds
+    members = [member for guild in guilds for member in guild.members]
+    return {
+        'guilds': len(guilds),
+        'members': len(members),
+        'users': len(bot.users),
+        'presences': sum(1 for member in members if member.activities),
+        'voice states': sum(len(channel.voice_states) for guild in guilds for channel in guild.voice_channels),
+        'channels': sum(len(guild.channels) for guild in guilds),
+        'threads': sum(len(guild.threads) for guild in guilds),
+        'roles': sum(len(guild.roles) for guild in guilds),
+        'emojis': len(bot.emojis),
+        'stickers': len(bot.stickers),
+        'messages': len(bot.cached_messages),
+        'persistent views': len(bot.persistent_views),
+    }
@@ -0,0 +1,379 @@
+'''
+Discovers and registers the features (plugins) found in the `source` directory.
+
+Every module directly in `source` is a plugin. Plugins are indexed by parsing their source
+rather than importing them, so a plugin is only imported once one of its features is needed,
+and a single plugin can be reloaded without restarting the bot.
+'''
+import os
+import ast
+import importlib
+import sys
+import discord
+from time import perf_counter
+from types import ModuleType
+from dataclasses import dataclass, field, KW_ONLY
+from discord.app_commands import Command, Group, ContextMenu, CheckFailure, guild_only
+from discord.ext.commands import Bot
+from source.tools.event_bus import EventBus
+from source.tools.config import BotConfig
+from source.tools.intents import missing_intents
+from source.tools.scheduler import Scheduler
+from source.tools.throttle import Throttle
+
+
+# maps each kind of feature to the base class its subclasses inherit from
+KINDS = {
+    'group': 'BaseGroup',
+    'command': 'BaseCommand',
+    'context_menu': 'BaseContextMenu',
+    'event': 'BaseEvent',
+    'ui': 'BasePersistentUI',
+    'task': 'BaseBackgroundTask',
+}
+
+# members with these permissions are mods even without the server's mod role, since they could give themselves the role
+MOD_PERMISSIONS = discord.Permissions(manage_guild=True)
+
+class NotMod(CheckFailure):
+    '''
+    Raised by the check of a mod only command or context menu when a member who isn't a mod uses it.
+    '''
+    pass
+
+def is_mod(interaction: discord.Interaction, config: BotConfig) -> bool:
+    '''
+    Return whether the member using `interaction` has the server's `mod_role` or `MOD_PERMISSIONS`.
+    '''
+    if interaction.permissions >= MOD_PERMISSIONS:
+        return True
+    guild = config.guild(interaction.guild_id)
+    return (
+        guild is not None and guild.mod_role is not None
+        and isinstance(interaction.user, discord.Member) and interaction.user.get_role(guild.mod_role) is not None
+    )
+
+@guild_only
+class GuildGroup(Group):
+    pass
+
+@guild_only
+class GuildCommand(Command):
+    pass
+
+@guild_only
+class GuildContext(ContextMenu):
+    pass
+
+def check_implementation(cls, **kwargs):
+    '''
+    Attempt to initialize a given class.\n
+    If successful, return an instance. Otherwise, raise an exception.
+    '''
+    try:
+        return cls(**kwargs)
+    except TypeError as e:
+        raise NotImplementedError(f'{cls.__name__} failed to override abstract method.') from e
+
+@dataclass
+class PluginSpec:
+    '''
+    What a plugin provides, found without importing it.
+
+    # Attributes
+      `name`: Name of the plugin, i.e. the module name without the package.
+      `module`: The full module name.
+      `classes`: The names of the classes of each kind (see `KINDS`) defined in the plugin.
+      `events`: The event each event class listens to.
+      `intents`: Intents declared by any class through an `intents` attribute (see `source/tools/intents.py`).
+      `import_time`: Seconds it took to (last) import the plugin. None if never imported.
+    '''
+    _: KW_ONLY
+    name: str
+    module: str
+    classes: dict[str, list[str]]
+    events: dict[str, str] = field(default_factory=dict)
+    intents: set[str] = field(default_factory=set)
+    import_time: float | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.module in sys.modules
+
+def _read_spec(path: str, module: str) -> PluginSpec:
+    with open(path) as file:
+        tree = ast.parse(file.read(), filename=path)
+
+    kinds = {base: kind for kind, base in KINDS.items()}
+    spec = PluginSpec(name=module.rsplit('.', 1)[-1], module=module, classes={kind: [] for kind in KINDS})
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for base in node.bases:
+            base_name = base.id if isinstance(base, ast.Name) else getattr(base, 'attr', None)
+            if base_name not in kinds:
+                continue
+            spec.classes[kinds[base_name]].append(node.name)
+            attributes = {
+                target.id: stmt.value
+                for stmt in node.body if isinstance(stmt, ast.Assign)
+                for target in stmt.targets if isinstance(target, ast.Name)
+            }
+            if kinds[base_name] == 'event':
+                # like BaseEvent, the event defaults to the class name unless an `event` attribute is set
+                event = attributes.get('event')
+                spec.events[node.name] = event.value if isinstance(event, ast.Constant) else node.name
+            if 'intents' in attributes:
+                # intents must be known before the bot exists, so they have to be literals
+                spec.intents.update(ast.literal_eval(attributes['intents']))
+
+    return spec
+
+def discover_plugins(package: str = 'source') -> dict[str, PluginSpec]:
+    '''
+    Index every plugin in the package directory. Nothing is imported.
+    '''
+    directory = os.path.join(*package.split('.'))
+    return {
+        filename[:-3]: _read_spec(os.path.join(directory, filename), f'{package}.{filename[:-3]}')
+        for filename in sorted(os.listdir(directory))
+        if filename.endswith('.py') and not filename.startswith('_')
+    }
+
+class PluginLoader:
+    '''
+    Registers the commands, context menus, events, persistent UI and background tasks of every plugin.
+
+    Plugins providing only events are imported on the first dispatch of one of their events.
+    Every other plugin must be imported at startup, since Discord needs to know its commands.
+
+    Commands are registered to every guild in the config at once, while persistent UI
+    is registered once per guild, since each guild has its own messages.
+
+    Features declaring `rate_limits` are throttled by `throttle`. None turns throttling off.
+
+    Commands whose `HelpInfo` is `mod_only`, and context menus that are `mod_only`, can only be used by mods (see `is_mod`).
+    They're still shown to everyone, since Discord can only hide commands by permission, not by role.
+    '''
+    def __init__(self, *, bot: Bot, config: BotConfig, event_bus: EventBus, scheduler: Scheduler, throttle: Throttle | None, package: str = 'source') -> None:
+        self.bot = bot
+        self.config = config
+        self.event_bus = event_bus
+        self.scheduler = scheduler
+        self.throttle = throttle
+        self.package = package
+        self.plugins: dict[str, PluginSpec] = {}
+        self._commands: dict[str, list[tuple[str, discord.AppCommandType, list[discord.Object]]]] = {}
+        self._tasks: dict[str, list[str]] = {}
+        self._listening: set[str] = set()
+        self._views_registered = False
+
+    def discover(self, plugins: dict[str, PluginSpec] | None = None) -> list[PluginSpec]:
+        '''
+        Index every plugin in the package directory, unless already indexed by `discover_plugins`. Nothing is imported.
+        '''
+        self.plugins.update(plugins if plugins is not None else discover_plugins(self.package))
+        return list(self.plugins.values())
+
+    def module(self, name: str, *, reload: bool = False) -> ModuleType:
+        '''
+        Import (or reload) a plugin, recording how long it took.
+        '''
+        spec = self.plugins[name]
+        if spec.loaded and not reload:
+            return sys.modules[spec.module]
+
+        start = perf_counter()
+        module = importlib.reload(sys.modules[spec.module]) if spec.loaded else importlib.import_module(spec.module)
+        spec.import_time = perf_counter() - start
+        print(f'[PLUGIN] {"reloaded" if reload else "imported"} {name} in {spec.import_time * 1000:.1f}ms')
+        return module
+
+    def classes(self, name: str, kind: str) -> list[type]:
+        spec = self.plugins[name]
+        if not spec.classes[kind]:
+            return []
+        module = self.module(name)
+        return [getattr(module, cls) for cls in spec.classes[kind]]
+
+    # ---------------------------------------
+    #             Registration
+    # ---------------------------------------
+    def register(self, name: str) -> None:
+        '''
+        Register the commands, context menus and events of a plugin.
+        '''
+        self._register_commands(name)
+        self._register_events(name)
+
+    def register_all(self) -> None:
+        for name in self.plugins:
+            self.register(name)
+
+    @property
+    def guilds(self) -> list[discord.Object]:
+        return [discord.Object(guild_id) for guild_id in self.config.guild_ids]
+
+    def _add_command(self, name: str, command: Command | Group | ContextMenu) -> None:
+        guilds = self.guilds
+        self.bot.tree.add_command(command, guilds=guilds)
+        self._commands.setdefault(name, []).append((command.name, getattr(command, 'type', discord.AppCommandType.chat_input), guilds))
+
+    async def _mod_check(self, interaction: discord.Interaction) -> bool:
+        if is_mod(interaction, self.config):
+            return True
+        raise NotMod()
+
+    def _mod_only(self, command: Command | ContextMenu, mod_only: bool) -> Command | ContextMenu:
+        # added before the throttle's check, so members who can't use the command don't use up its tokens
+        if mod_only:
+            command.add_check(self._mod_check)
+        return command
+
+    def _throttled(self, command: Command | ContextMenu, feature: str, feature_object) -> Command | ContextMenu:
+        # the check runs before the callback, so a throttled interaction never reaches the feature
+        if self.throttle is not None and feature_object.rate_limits is not None:
+            command.add_check(self.throttle.command_check(feature, feature_object.rate_limits))
+        return command
+
+    def _register_commands(self, name: str) -> None:
+        for group_class in self.classes(name, 'group'):
+            group = check_implementation(group_class)
+            guild_group = GuildGroup(name=group.name, description=group.desc)
+
+            for cmd_class in group.commands:
+                cmd_class._is_registered = True
+                cmd = check_implementation(cmd_class, bot=self.bot, config=self.config)
+                command = self._mod_only(GuildCommand(name=cmd.name, description=cmd.desc, callback=cmd.action), cmd.help_info().mod_only)
+                guild_group.add_command(self._throttled(command, f'{group.name} {cmd.name}', cmd))
+
+            self._add_command(name, guild_group)
+
+        for cmd_class in self.classes(name, 'command'):
+            if cmd_class._is_registered: continue
+
+            cmd = check_implementation(cmd_class, bot=self.bot, config=self.config)
+            command = self._mod_only(GuildCommand(name=cmd.name, description=cmd.desc, callback=cmd.action), cmd.help_info().mod_only)
+            self._add_command(name, self._throttled(command, cmd.name, cmd))
+
+        for ctx_class in self.classes(name, 'context_menu'):
+            ctx = check_implementation(ctx_class, bot=self.bot, config=self.config)
+            menu = self._mod_only(GuildContext(name=ctx.name, callback=ctx.action), ctx.mod_only)
+            self._add_command(name, self._throttled(menu, ctx.name, ctx))
+
+    def _listen(self, event: str) -> None:
+        # the bus looks up handlers on each dispatch, so each event only needs one listener
+        if event not in self._listening:
+            self._listening.add(event)
+            self.bot.add_listener(self.event_bus.listener(event), event)
+
+    def _register_events(self, name: str) -> None:
+        spec = self.plugins[name]
+        if spec.loaded or not spec.events:
+            for event_class in self.classes(name, 'event'):
+                event = check_implementation(event_class, bot=self.bot, config=self.config)
+                self.event_bus.subscribe(event.event, event.action, name=event_class.__name__, timeout=event.timeout)
+                self._listen(event.event)
+            return
+
+        # not imported yet, so subscribe placeholders that import the plugin on first use
+        for cls_name, event in spec.events.items():
+            self.event_bus.subscribe(event, self._lazy_handler(name, cls_name, event), name=cls_name, timeout=None)
+            self._listen(event)
+
+    def _lazy_handler(self, name: str, cls_name: str, event: str):
+        async def handler(*args, **kwargs):
+            # importing doesn't yield, so only the first dispatch swaps the placeholders out
+            if not self.plugins[name].loaded:
+                self.module(name)
+                self._unregister_events(name)
+                self._register_events(name)
+            await self.event_bus.dispatch_to(event, cls_name, *args, **kwargs)
+
+        return handler
+
+    def register_views(self, name: str) -> None:
+        for ui_class in self.classes(name, 'ui'):
+            for guild_id in self.config.guild_ids:
+                ui = check_implementation(ui_class, bot=self.bot, config=self.config, guild_id=guild_id)
+                if ui.enabled:
+                    view = ui.view(timeout=None)
+                    if self.throttle is not None and ui.rate_limits is not None:
+                        # checked by discord.py before any of the view's callbacks
+                        view.interaction_check = self.throttle.view_check(ui_class.__name__, ui.rate_limits)
+                    self.bot.add_view(view, message_id=ui.message)
+
+    def register_all_views(self) -> None:
+        '''
+        Must be called from `setup_hook`, since views need the bot's event loop.
+        '''
+        self._views_registered = True
+        for name in self.plugins:
+            self.register_views(name)
+
+    def start_tasks(self, name: str) -> None:
+        '''
+        Start the background tasks of a plugin. Tasks that are already running aren't started again.
+        '''
+        self._tasks.setdefault(name, [])
+        for task_class in self.classes(name, 'task'):
+            task_name = f'{name}.{task_class.__name__}'
+            if task_name not in self._tasks[name]:
+                self._tasks[name].append(task_name)
+            if not self.scheduler.running(task_name):
+                self.scheduler.start(task_name, check_implementation(task_class, bot=self.bot, config=self.config))
+
+    def start_all_tasks(self) -> None:
+        for name in self.plugins:
+            self.start_tasks(name)
+
+    def stop_all_tasks(self) -> None:
+        '''
+        Stop every background task, e.g. when another instance takes them over.
+        '''
+        for name in list(self._tasks):
+            for task_name in self._tasks.pop(name):
+                self.scheduler.stop(task_name)
+
+    # ---------------------------------------
+    #              Hot Reload
+    # ---------------------------------------
+    def _unregister_events(self, name: str) -> None:
+        for cls_name, event in self.plugins[name].events.items():
+            self.event_bus.unsubscribe(event, cls_name)
+
+    def unregister(self, name: str) -> None:
+        '''
+        Remove the commands and events of a plugin, and stop its background tasks.
+        Persistent UI is replaced rather than removed, once the plugin is registered again.
+        '''
+        for cmd_name, cmd_type, guilds in self._commands.pop(name, []):
+            for guild in guilds:
+                self.bot.tree.remove_command(cmd_name, guild=guild, type=cmd_type)
+        self._unregister_events(name)
+        for task_name in self._tasks.pop(name, []):
+            self.scheduler.stop(task_name)
+
+    def reload(self, name: str) -> float:
+        '''
+        Reload a plugin and register everything it provides again. Returns the import time.\n
+        Call `sync_commands` afterwards so Discord picks up changed commands.
+        '''
+        had_tasks = name in self._tasks
+        self.unregister(name)
+
+        spec = self.plugins[name]
+        path = os.path.join(*self.package.split('.'), f'{name}.py')
+        self.plugins[name] = _read_spec(path, spec.module) # the plugin's features may have changed
+        self.plugins[name].import_time = spec.import_time
+        missing = missing_intents(self.plugins[name], self.bot.intents)
+        if missing:
+            print(f'[PLUGIN] {name} needs the {", ".join(sorted(missing))} intents, which take effect after a restart')
+        self.module(name, reload=spec.loaded)
+
+        self.register(name)
+        if self._views_registered:
+            self.register_views(name)
+        if had_tasks:
+            self.start_tasks(name)
+        return self.plugins[name].import_time
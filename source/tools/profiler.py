@@ -0,0 +1,192 @@
+'''
+Finds code that blocks the event loop.
+
+`LoopMonitor` notices when the loop stops running callbacks for longer than a threshold,
+and captures the stack of whatever is blocking it while it still is. `SamplingProfiler`
+periodically samples the stack of the loop's thread, and writes the samples in the folded
+format that flamegraph tools (flamegraph.pl, speedscope, inferno) read.
+
+Both sample from a separate thread, so they keep working while the loop is blocked.
+'''
+import os
+import sys
+import asyncio
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field, KW_ONLY
+from time import monotonic, time
+from types import FrameType
+
+
+PROFILE_DIRECTORY = 'data/profiles'
+
+def _frame_name(frame: FrameType, line: bool) -> str:
+    # the current line is more useful for a single stack, while samples are grouped by function
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno if line else code.co_firstlineno})'
+
+def _stack(thread_id: int, *, lines: bool = True) -> list[str]:
+    # the stack of a thread, outermost frame first
+    frame = sys._current_frames().get(thread_id)
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame, lines))
+        frame = frame.f_back
+    return stack[::-1]
+
+# ---------------------------------------
+#             Loop Monitor
+# ---------------------------------------
+@dataclass
+class Stall:
+    '''
+    A period during which the event loop was blocked.
+
+    # Attributes
+      `started`: Unix timestamp of when the loop was last seen running.
+      `duration`: Seconds the loop was blocked for. Grows until the loop runs again.
+      `stack`: The stack of the loop's thread while it was blocked, outermost frame first.
+    '''
+    _: KW_ONLY
+    started: float
+    duration: float
+    stack: list[str] = field(default_factory=list)
+
+    @property
+    def culprit(self) -> str:
+        # the innermost frame outside of asyncio, which is usually the blocking call
+        for frame in reversed(self.stack):
+            if 'asyncio' not in frame and 'selectors' not in frame:
+                return frame
+        return self.stack[-1] if self.stack else 'unknown'
+
+class LoopMonitor:
+    '''
+    Records every time the event loop is blocked for longer than `threshold` seconds.\n
+    A coroutine on the loop heartbeats every `interval` seconds, while a watchdog thread
+    captures the loop's stack once the heartbeat is late by more than `threshold`.
+    '''
+    def __init__(self, *, threshold: float = 0.25, interval: float = 0.05, history: int = 100) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: deque[Stall] = deque(maxlen=history)
+        self._unreported: list[Stall] = []
+        self._beat = monotonic()
+        self._thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        '''
+        Must be called from the event loop's thread.
+        '''
+        if self.running:
+            return
+        self._thread_id = threading.get_ident()
+        self._beat = monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name='loop-monitor', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        stall: Stall | None = None
+        beat = None
+        while not self._stop.wait(self.interval):
+            late = monotonic() - self._beat - self.interval
+            if stall is not None and self._beat == beat:
+                stall.duration = late + self.interval
+            elif late > self.threshold:
+                beat = self._beat
+                stall = Stall(started=time() - late, duration=late + self.interval, stack=_stack(self._thread_id))
+                self.stalls.append(stall)
+                self._unreported.append(stall)
+            else:
+                stall = None
+
+    def unreported(self) -> list[Stall]:
+        '''
+        Return the stalls since the last call. Called from the loop, so none of them are ongoing.
+        '''
+        stalls, self._unreported = self._unreported, []
+        return stalls
+
+# ---------------------------------------
+#           Sampling Profiler
+# ---------------------------------------
+class SamplingProfiler:
+    '''
+    Samples the stack of the event loop's thread every `interval` seconds while running.
+    '''
+    def __init__(self, *, interval: float = 0.005, directory: str = PROFILE_DIRECTORY) -> None:
+        self.interval = interval
+        self.directory = directory
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self.started: float | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        '''
+        Must be called from the event loop's thread. Returns False if already running.
+        '''
+        if self.running:
+            return False
+        self.samples.clear()
+        self.started = time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(threading.get_ident(),), name='profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def _sample(self, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            stack = _stack(thread_id, lines=False)
+            if stack:
+                self.samples[tuple(stack)] += 1
+
+    def stop(self) -> str:
+        '''
+        Stop sampling, and write the samples as folded stacks. Returns the path of the file.
+        '''
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'profile-{int(self.started or time())}.folded')
+        with open(path, 'w') as file:
+            for stack, count in self.samples.most_common():
+                file.write(f'{";".join(stack)} {count}\n')
+        return path
+
+    def summary(self, top: int = 10) -> list[tuple[str, float, float]]:
+        '''
+        Return the `top` functions by the share of samples they were running in (self), as
+        `(function, self share, total share)`, where total also counts the functions they called.
+        '''
+        total = sum(self.samples.values())
+        if not total:
+            return []
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.samples.items():
+            own[stack[-1]] += count
+            for frame in set(stack):
+                inclusive[frame] += count
+        return [(frame, count / total, inclusive[frame] / total) for frame, count in own.most_common(top)]
@@ -0,0 +1,107 @@
+'''
+Counts of the roles members give themselves (class years, announcements), without scanning members.
+
+The members of each role are kept in SQLite and updated as roles change, so a count is a
+lookup on the table's primary key. Updates say which roles a member has rather than adjusting a
+number, so the same change reported twice (by the role menu and by Discord's event, or by two
+instances of the bot) is counted once. Nothing is cached in memory, so instances sharing the
+file always agree.
+A periodic full scan corrects anything missed while the bot was offline, and records each
+count, building the history that trends are read from.
+'''
+import os
+import sqlite3
+from time import time
+from source.tools.config import GuildConfig
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS role_members (
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, role_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS role_members_user ON role_members (guild_id, user_id);
+CREATE TABLE IF NOT EXISTS role_history (
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    at REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, role_id, at)
+) WITHOUT ROWID;
+'''
+
+def managed_roles(guild_config: GuildConfig | None) -> dict[str, int]:
+    '''
+    Return the self-assignable roles of a server by name: its class roles, and its announcement role.
+    '''
+    roles = {}
+    if guild_config and guild_config.class_roles_config:
+        roles.update(guild_config.class_roles_config.roles)
+    if guild_config and guild_config.announcement_role_config:
+        roles['Announcements'] = guild_config.announcement_role_config.role
+    return roles
+
+class RoleCounts:
+    '''
+    The members of each tracked role, by server, with a history of their counts.
+    '''
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode = WAL') # other instances can read while one writes
+        self._db.executescript(_SCHEMA)
+
+    def count(self, guild_id: int, role_id: int) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM role_members WHERE guild_id = ? AND role_id = ?', (guild_id, role_id)).fetchone()[0]
+
+    def update(self, guild_id: int, user_id: int, *, added: list[int] = (), removed: list[int] = ()) -> None:
+        '''
+        Record that a member has the roles in `added`, and doesn't have those in `removed`.
+        '''
+        with self._db:
+            self._db.executemany('INSERT OR IGNORE INTO role_members VALUES (?, ?, ?)', [(guild_id, role_id, user_id) for role_id in added])
+            self._db.executemany('DELETE FROM role_members WHERE guild_id = ? AND role_id = ? AND user_id = ?', [(guild_id, role_id, user_id) for role_id in removed])
+
+    def remove_member(self, guild_id: int, user_id: int) -> None:
+        '''
+        Record that a member left the server.
+        '''
+        with self._db:
+            self._db.execute('DELETE FROM role_members WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+
+    def reconcile(self, guild_id: int, members: dict[int, set[int]]) -> dict[int, int]:
+        '''
+        Replace the members of each role in `members` with those found by a full scan, and record their counts.
+        Returns how far off each count was, as scanned minus counted.
+        '''
+        drift, now = {}, time()
+        with self._db:
+            for role_id, user_ids in members.items():
+                drift[role_id] = len(user_ids) - self.count(guild_id, role_id)
+                self._db.execute('DELETE FROM role_members WHERE guild_id = ? AND role_id = ?', (guild_id, role_id))
+                self._db.executemany('INSERT INTO role_members VALUES (?, ?, ?)', [(guild_id, role_id, user_id) for user_id in user_ids])
+                self._db.execute('INSERT OR REPLACE INTO role_history VALUES (?, ?, ?, ?)', (guild_id, role_id, now, len(user_ids)))
+        return drift
+
+    def count_at(self, guild_id: int, role_id: int, at: float) -> int | None:
+        '''
+        Return the last recorded count at or before `at`, or None if there's none.
+        '''
+        row = self._db.execute(
+            'SELECT count FROM role_history WHERE guild_id = ? AND role_id = ? AND at <= ? ORDER BY at DESC LIMIT 1',
+            (guild_id, role_id, at)
+        ).fetchone()
+        return row[0] if row else None
+
+    def history(self, guild_id: int, role_id: int, *, limit: int = 30) -> list[tuple[float, int]]:
+        '''
+        Return the last `limit` recorded counts as `(timestamp, count)`, oldest first.
+        '''
+        rows = self._db.execute(
+            'SELECT at, count FROM role_history WHERE guild_id = ? AND role_id = ? ORDER BY at DESC LIMIT ?',
+            (guild_id, role_id, limit)
+        ).fetchall()
+        return rows[::-1]
@@ -0,0 +1,265 @@
+'''
+Runs background tasks on interval or cron schedules.
+
+Unlike `tasks.loop`, the time of each task's last run is persisted, so a restart doesn't
+reset its schedule, and starting a task that's already running does nothing. Blocking
+work can be offloaded to a thread or process pool instead of stalling the event loop.
+'''
+import os
+import json
+import random
+import asyncio
+import traceback
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field, KW_ONLY
+from datetime import datetime, time as day_time, timedelta
+from functools import partial
+from time import time, perf_counter
+from typing import Any, Callable
+
+
+SCHEDULE_STATE_PATH = 'data/schedule.json'
+
+# ---------------------------------------
+#               Schedules
+# ---------------------------------------
+class Interval:
+    '''
+    Run every fixed period, e.g. `Interval(hours=24)`.\n
+    `jitter` is the most seconds each run is randomly delayed by.
+    '''
+    def __init__(self, *, seconds: float = 0, minutes: float = 0, hours: float = 0, days: float = 0, jitter: float = 0) -> None:
+        self.period = timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds).total_seconds()
+        if self.period <= 0:
+            raise ValueError('an interval must be positive')
+        self.jitter = jitter
+
+    def next_run(self, after: float) -> float:
+        return after + self.period
+
+    def __str__(self) -> str:
+        return f'every {timedelta(seconds=self.period)}'
+
+def _parse_field(text: str, low: int, high: int) -> list[int]:
+    # supports *, n, a-b and a step on any of them (*/n, a-b/n, a/n), separated by commas
+    values = set()
+    for part in text.split(','):
+        part, slash, step = part.partition('/')
+        step = int(step) if slash else 1
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if slash else start
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f'{text!r} must be within {low}-{high}')
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+class Cron:
+    '''
+    Run at the times matching a standard five field cron expression
+    (minute, hour, day of month, month, day of week), in local time.\n
+    `jitter` is the most seconds each run is randomly delayed by.
+    '''
+    def __init__(self, expression: str, *, jitter: float = 0) -> None:
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f'{expression!r} must have five fields')
+        self.expression = expression
+        self.jitter = jitter
+        self.minutes = _parse_field(parts[0], 0, 59)
+        self.hours = _parse_field(parts[1], 0, 23)
+        self.days = set(_parse_field(parts[2], 1, 31))
+        self.months = set(_parse_field(parts[3], 1, 12))
+        self.weekdays = {day % 7 for day in _parse_field(parts[4], 0, 7)} # both 0 and 7 are Sunday
+        self._any_day, self._any_weekday = parts[2] == '*', parts[4] == '*'
+
+    def _matches(self, date: datetime) -> bool:
+        if date.month not in self.months:
+            return False
+        day, weekday = date.day in self.days, date.isoweekday() % 7 in self.weekdays
+        # like cron, a restricted day of month and day of week match if either does
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_run(self, after: float) -> float:
+        start = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        date = start.date()
+        for _ in range(366 * 8): # long enough for Feb 29 to come around
+            if self._matches(date):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.combine(date, day_time(hour, minute))
+                        if candidate >= start:
+                            return candidate.timestamp()
+            date += timedelta(days=1)
+        raise ValueError(f'{self.expression!r} never matches')
+
+    def __str__(self) -> str:
+        return f'cron {self.expression}'
+
+# ---------------------------------------
+#               Executors
+# ---------------------------------------
+_EXECUTORS: dict[str, Executor] = {}
+
+def executor(kind: str) -> Executor:
+    '''
+    Return the shared `'thread'` or `'process'` pool, creating it on first use.
+    '''
+    if kind not in _EXECUTORS:
+        if kind == 'thread':
+            _EXECUTORS[kind] = ThreadPoolExecutor(max_workers=4, thread_name_prefix='task')
+        elif kind == 'process':
+            _EXECUTORS[kind] = ProcessPoolExecutor(max_workers=2)
+        else:
+            raise ValueError(f'{kind!r} is not an executor')
+    return _EXECUTORS[kind]
+
+async def offload(func: Callable, *args, kind: str = 'thread', **kwargs) -> Any:
+    '''
+    Run a blocking function in the thread or process pool.
+    Functions sent to the process pool (and their arguments) must be picklable.
+    '''
+    return await asyncio.get_running_loop().run_in_executor(executor(kind), partial(func, *args, **kwargs))
+
+# ---------------------------------------
+#               Scheduler
+# ---------------------------------------
+@dataclass
+class TaskRun:
+    '''
+    The timing of a single run of a task.
+
+    # Attributes
+      `started`: Unix timestamp of when the run started.
+      `duration`: Seconds the run took.
+      `error`: The exception the run raised, if any.
+    '''
+    _: KW_ONLY
+    started: float
+    duration: float
+    error: str | None = None
+
+@dataclass
+class TaskState:
+    '''
+    A started task and its run history.
+    '''
+    _: KW_ONLY
+    name: str
+    task: Any
+    handle: asyncio.Task | None = None
+    next_run: float | None = None
+    last_run: float | None = None
+    history: deque[TaskRun] = field(default_factory=deque)
+
+    @property
+    def running(self) -> bool:
+        return self.handle is not None and not self.handle.done()
+
+class Scheduler:
+    '''
+    Runs tasks (see `BaseBackgroundTask`) on their schedules.
+
+    The last run of each task is persisted to `path`. When a run was missed while the bot
+    was offline, a task whose `policy` is `'catch_up'` runs once right away, while one whose
+    policy is `'skip'` waits for its next scheduled time. A task never runs concurrently with itself.
+
+    When `guard` is given, a run is skipped whenever it returns False (e.g. when this instance stopped being the leader).
+    '''
+    def __init__(self, path: str = SCHEDULE_STATE_PATH, *, history: int = 50, guard: Callable[[], bool] | None = None) -> None:
+        self.path = path
+        self.history = history
+        self.guard = guard
+        self.tasks: dict[str, TaskState] = {}
+        self.load()
+
+    def load(self) -> None:
+        '''
+        Read the last runs from `path`, e.g. after another instance ran the tasks. Must not be called while tasks are running.
+        '''
+        try:
+            with open(self.path) as file:
+                self._last_runs: dict[str, float] = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._last_runs = {}
+        for name, state in self.tasks.items():
+            state.last_run = self._last_runs.get(name, state.last_run)
+
+    def _save(self) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f'{self.path}.tmp', 'w') as file:
+            json.dump(self._last_runs, file)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def running(self, name: str) -> bool:
+        return name in self.tasks and self.tasks[name].running
+
+    def start(self, name: str, task: Any) -> bool:
+        '''
+        Schedule `task` under `name`. Returns False, doing nothing, if a task by that name is already running.
+        '''
+        if self.running(name):
+            return False
+        state = self.tasks.setdefault(name, TaskState(name=name, task=task, last_run=self._last_runs.get(name), history=deque(maxlen=self.history)))
+        state.task = task # the history is kept when a reloaded task is started again
+        state.handle = asyncio.get_running_loop().create_task(self._loop(state), name=f'task-{name}')
+        return True
+
+    def stop(self, name: str) -> None:
+        '''
+        Stop a task. It counts as stopped right away, so it can be started again at once (e.g. by a plugin reload),
+        even though its cancelled run only unwinds on the loop's next iteration.
+        '''
+        state = self.tasks.get(name)
+        if state and state.running:
+            state.handle.cancel()
+        if state:
+            state.handle = None
+
+    def stop_all(self) -> None:
+        for name in self.tasks:
+            self.stop(name)
+
+    def _due(self, state: TaskState) -> float:
+        now = time()
+        if state.last_run is None:
+            return now # never run before, like tasks.loop
+        due = state.task.schedule.next_run(state.last_run)
+        if due > now:
+            return due
+        return now if state.task.policy == 'catch_up' else state.task.schedule.next_run(now)
+
+    async def _loop(self, state: TaskState) -> None:
+        while True:
+            state.next_run = self._due(state)
+            await asyncio.sleep(max(state.next_run - time(), 0) + random.uniform(0, state.task.schedule.jitter))
+            while self.guard and not self.guard():
+                # not allowed to run now, so wait for the next scheduled time
+                state.next_run = state.task.schedule.next_run(time())
+                await asyncio.sleep(state.next_run - time())
+            await self._run(state)
+
+    async def _run(self, state: TaskState) -> None:
+        task, error = state.task, None
+        state.last_run = time()
+        start = perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(task.action):
+                await task.action()
+            else:
+                await offload(task.action, kind=task.executor)
+        except Exception as e:
+            error = repr(e)
+            traceback.print_exc()
+
+        state.history.append(TaskRun(started=state.last_run, duration=perf_counter() - start, error=error))
+        self._last_runs[state.name] = state.last_run
+        self._save()
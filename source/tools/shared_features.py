@@ -5,9 +5,20 @@ import discord
 from discord import ui
 from discord.utils import MISSING
 from source.tools.ui_helper import generate_embed
+from source.tools.ticket_store import TicketStore
+from source.tools.jobs import DigestStore
+from source.tools.job_store import JobStore
+from source.tools.profiler import Stall, SamplingProfiler
+from source.tools.role_counts import RoleCounts
 from dataclasses import dataclass, KW_ONLY
 
 
+TICKETS = TicketStore('data/tickets.db')
+DIGESTS = DigestStore('data/digests')
+JOBS = JobStore('data/jobs.db')
+ROLE_COUNTS = RoleCounts('data/roles.db')
+
+
 @dataclass
 class HelpInfo:
     '''
@@ -17,7 +28,7 @@ class HelpInfo:
       `name`: Name of the command.
       `desc`: Description of the command.
       `group`: The group that the command belongs to (for slash commands). Defaults to None.
-      `mod_only`: Whether the command is mod_only. Defaults to False.
+      `mod_only`: Whether the command is mod_only, i.e. only mods can use it (see `is_mod` in `source/tools/plugin_loader.py`). Defaults to False.
     '''
     _: KW_ONLY
     name: str
@@ -27,11 +38,13 @@ class HelpInfo:
 
     def display(self):
         # returns name and description in correct format for /help command display
-        return f"`/{self.name}`: {self.desc}"
+        name = f'{self.group} {self.name}' if self.group else self.name
+        return f"`/{name}`: {self.desc}"
 
 class SupportModal(ui.Modal, title='Help Form'):
     '''
     Support Modal used by the help button and help command.
+    Every ticket is also saved to `TICKETS`, so it can be searched later.
     '''
     brief = ui.TextInput(label='Title', placeholder='Briefly title your problem.', max_length=50)
     explain = ui.TextInput(label='Explanation', placeholder='Explain your problem in full. Please give as many details as possible.', style=discord.TextStyle.long)
@@ -42,7 +55,13 @@ class SupportModal(ui.Modal, title='Help Form'):
         self.channel = channel
 
     async def on_submit(self, interaction: discord.Interaction) -> None:
-        brief, explain, contact = self.brief.value, self.explain.value, self.contact.value
+        brief, explain, contact = self.brief.value.strip(), self.explain.value.strip(), self.contact.value.strip()
+
+        duplicate = TICKETS.find_duplicate(guild_id=interaction.guild_id, user_id=interaction.user.id, title=brief, explanation=explain)
+        if duplicate:
+            await interaction.response.send_message(f'You already opened this ticket (#{duplicate.id}). Expect a response from a board member soon.', ephemeral=True)
+            return
+        ticket = TICKETS.add(guild_id=interaction.guild_id, user_id=interaction.user.id, user=interaction.user.display_name, title=brief, explanation=explain, contact=contact)
 
         contact_field = []
         if contact:
@@ -50,18 +69,57 @@ class SupportModal(ui.Modal, title='Help Form'):
                 'name': 'Contact Info',
                 'value': contact
             })
-        await self.channel.send(embed=generate_embed({
-                'author': {
-                    'name': interaction.user.display_name,
-                    'icon_url': interaction.user.display_avatar
-                },
-                'color': 0x0ec940,
-                'title': brief,
-                'description': explain,
-                'fields': [{
-                    'name': 'Discord Mention',
-                    'value': interaction.user.mention
-                }] + contact_field
-            }))
+        try:
+            message = await self.channel.send(embed=generate_embed({
+                    'author': {
+                        'name': interaction.user.display_name,
+                        'icon_url': interaction.user.display_avatar
+                    },
+                    'color': 0x0ec940,
+                    'title': brief,
+                    'description': explain,
+                    'fields': [{
+                        'name': 'Discord Mention',
+                        'value': interaction.user.mention
+                    }] + contact_field,
+                    'footer': {
+                        'text': f'Ticket #{ticket.id}'
+                    }
+                }))
+        except Exception:
+            # nothing was posted, so the ticket mustn't block the user from trying again
+            TICKETS.delete(ticket.id)
+            raise
+        TICKETS.set_message(ticket.id, message.id)
 
-        await interaction.response.send_message('Successfully opened a support ticket. Expect a response from a board member soon.', ephemeral=True)
\ No newline at end of file
+        await interaction.response.send_message('Successfully opened a support ticket. Expect a response from a board member soon.', ephemeral=True)
+
+def stall_embed(stalls: list[Stall]) -> discord.Embed:
+    '''
+    Embed listing the longest times the event loop was blocked, and what blocked it.
+    Used by the `lag_report` task and the `/profile lag` command.
+    '''
+    longest = sorted(stalls, key=lambda stall: stall.duration, reverse=True)[:10]
+    return generate_embed({
+        'title': 'Event Loop Stalls',
+        'description': f'{len(stalls)} stalls, {sum(stall.duration for stall in stalls):.2f}s blocked in total.' if stalls else 'The event loop has not been blocked.',
+        'color': 0xd62d20,
+        'fields': [
+            {
+                'name': f'{stall.duration * 1000:.0f} ms <t:{int(stall.started)}:R>',
+                'value': '```\n' + '\n'.join(stall.stack[-6:]) + '\n```' # the innermost frames
+            }
+            for stall in longest
+        ]
+    })
+
+def profile_embed(profiler: SamplingProfiler, path: str) -> discord.Embed:
+    '''
+    Embed summarizing a profile by the functions that ran the most.
+    '''
+    lines = [f'`{own * 100:5.1f}% {total * 100:5.1f}%` {function}' for function, own, total in profiler.summary()]
+    return generate_embed({
+        'title': 'Profile',
+        'description': f'{sum(profiler.samples.values())} samples, written to `{path}`.\nSelf and total share of samples:\n' + '\n'.join(lines),
+        'color': 0x072c59
+    })
\ No newline at end of file
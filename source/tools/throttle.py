@@ -0,0 +1,202 @@
+'''
+Token buckets limiting how often users can trigger expensive features.
+
+Discord's rate limits are shared by the whole bot, so one user spamming a button that edits
+roles or posts messages slows that feature down for everyone. Features declare `rate_limits`,
+and each interaction takes a token from the user's bucket, the feature's bucket and a bucket
+shared by every throttled feature. An interaction finding any of them empty is turned away
+with a single ephemeral response, before the feature makes any API calls.
+
+`Throttle` keeps its buckets in memory, so each instance of the bot would allow the full rate.
+`SQLiteThrottle` keeps them in an SQLite file, for instances sharing a file system.
+'''
+import os
+import math
+import asyncio
+import sqlite3
+import discord
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, KW_ONLY
+from discord import app_commands
+from threading import Lock
+from time import monotonic, time
+
+
+THROTTLE_PATH = 'data/throttle.db'
+
+
+@dataclass(frozen=True)
+class TokenRate:
+    '''
+    Bursts of up to `tokens` requests, refilled at `tokens` every `per` seconds.
+    '''
+    _: KW_ONLY
+    tokens: int
+    per: float
+
+@dataclass(frozen=True)
+class RateLimits:
+    '''
+    The limits of a feature. `user` applies to each user separately, `command` to everyone using the feature together.
+    '''
+    _: KW_ONLY
+    user: TokenRate | None = None
+    command: TokenRate | None = None
+
+class Throttled(app_commands.CheckFailure):
+    '''
+    Raised by the check of a throttled command, once the user has been told to slow down.
+    '''
+    pass
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, rate: TokenRate, now: float) -> None:
+        self.tokens = float(rate.tokens)
+        self.updated = now
+
+    def refill(self, rate: TokenRate, now: float) -> None:
+        self.tokens = min(rate.tokens, self.tokens + (now - self.updated) * rate.tokens / rate.per)
+        self.updated = now
+
+class Throttle:
+    '''
+    The buckets of every throttled feature, plus one shared by all of them, limited to `everyone`.\n
+    At most `max_buckets` are kept, dropping the least recently used. A dropped bucket was idle, so it would be full anyway.
+
+    ## Attributes
+      `throttled`: How many interactions were turned away by this instance, by feature and the bucket that was empty.
+    '''
+    def __init__(self, *, everyone: TokenRate = TokenRate(tokens=20, per=1.0), max_buckets: int = 10_000) -> None:
+        self.everyone = everyone
+        self.max_buckets = max_buckets
+        self.throttled: Counter[tuple[str, str]] = Counter()
+        self._buckets: OrderedDict[tuple, _Bucket] = OrderedDict()
+
+    def _bucket(self, key: tuple, rate: TokenRate, now: float) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(rate, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.refill(rate, now)
+        return bucket
+
+    def take(self, feature: str, limits: RateLimits, user_id: int) -> float:
+        '''
+        Take a token from each of the buckets `user_id` uses for `feature`.
+        Returns 0 if there were enough, otherwise the seconds until there are, in which case none are taken.
+        '''
+        now = monotonic()
+        buckets = [
+            (scope, rate, self._bucket(key, rate, now))
+            for scope, key, rate in (
+                ('user', (feature, user_id), limits.user),
+                ('command', (feature,), limits.command),
+                ('everyone', (), self.everyone)
+            )
+            if rate is not None
+        ]
+        empty = [(scope, (1 - bucket.tokens) * rate.per / rate.tokens) for scope, rate, bucket in buckets if bucket.tokens < 1]
+        if empty:
+            scope, wait = max(empty, key=lambda item: item[1])
+            self.throttled[(feature, scope)] += 1
+            return wait
+        for _, _, bucket in buckets:
+            bucket.tokens -= 1
+        return 0.0
+
+    async def _take(self, feature: str, limits: RateLimits, user_id: int) -> float:
+        return self.take(feature, limits, user_id)
+
+    async def allow(self, interaction: discord.Interaction, feature: str, limits: RateLimits) -> bool:
+        '''
+        Return whether `interaction` may use `feature`, telling the user to slow down if not.
+        '''
+        wait = await self._take(feature, limits, interaction.user.id)
+        if not wait:
+            return True
+        await interaction.response.send_message(f"You're doing that too often. Try again in {math.ceil(wait)} seconds.", ephemeral=True)
+        return False
+
+    def command_check(self, feature: str, limits: RateLimits):
+        '''
+        Return a check for a command or context menu (see `Command.add_check`).
+        '''
+        async def check(interaction: discord.Interaction) -> bool:
+            if await self.allow(interaction, feature, limits):
+                return True
+            raise Throttled()
+        return check
+
+    def view_check(self, feature: str, limits: RateLimits):
+        '''
+        Return an `interaction_check` for a view. A view ignores interactions its check rejects.
+        '''
+        async def check(interaction: discord.Interaction) -> bool:
+            return await self.allow(interaction, feature, limits)
+        return check
+
+class SQLiteThrottle(Throttle):
+    '''
+    A `Throttle` keeping its buckets in an SQLite file, so instances of the bot sharing it share their limits.
+    Buckets are refilled by wall-clock time, since instances don't share a monotonic clock. Every `prune_every`
+    takes, buckets that have been idle long enough to be full are deleted, so `max_buckets` is unused.
+    '''
+    def __init__(self, path: str = THROTTLE_PATH, *, everyone: TokenRate = TokenRate(tokens=20, per=1.0), prune_every: int = 1000) -> None:
+        super().__init__(everyone=everyone)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.prune_every = prune_every
+        self._takes = 0
+        self._lock = Lock()
+        # autocommit, so each take is its own BEGIN IMMEDIATE transaction
+        self._db = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.execute('PRAGMA synchronous = NORMAL') # losing the last few takes in a power cut is harmless
+        self._db.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, per REAL NOT NULL) WITHOUT ROWID')
+
+    def take(self, feature: str, limits: RateLimits, user_id: int) -> float:
+        now = time()
+        buckets = [
+            (scope, repr(key), rate)
+            for scope, key, rate in (
+                ('user', (feature, user_id), limits.user),
+                ('command', (feature,), limits.command),
+                ('everyone', (), self.everyone)
+            )
+            if rate is not None
+        ]
+        with self._lock:
+            # the write lock is taken before reading, so two instances can't both take the last token
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                tokens = []
+                for _, key, rate in buckets:
+                    row = self._db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                    tokens.append(rate.tokens if row is None else min(rate.tokens, row[0] + max(0.0, now - row[1]) * rate.tokens / rate.per))
+                empty = [(scope, (1 - left) * rate.per / rate.tokens) for (scope, _, rate), left in zip(buckets, tokens) if left < 1]
+                if not empty:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO buckets (key, tokens, updated, per) VALUES (?, ?, ?, ?)',
+                        [(key, left - 1, now, rate.per) for (_, key, rate), left in zip(buckets, tokens)]
+                    )
+                self._takes += 1
+                if self._takes % self.prune_every == 0:
+                    self._db.execute('DELETE FROM buckets WHERE updated + per < ?', (now,))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        if empty:
+            scope, wait = max(empty, key=lambda item: item[1])
+            self.throttled[(feature, scope)] += 1
+            return wait
+        return 0.0
+
+    async def _take(self, feature: str, limits: RateLimits, user_id: int) -> float:
+        # another instance may hold the write lock for a moment
+        return await asyncio.to_thread(self.take, feature, limits, user_id)
@@ -0,0 +1,178 @@
+'''
+Local SQLite store for support tickets, with an FTS5 index for searching them.
+
+Looking up old tickets from here is far cheaper than scrolling through the help channel.
+'''
+import os
+import sqlite3
+from time import time
+from dataclasses import dataclass, KW_ONLY
+from source.tools.fts import match_expression
+
+
+@dataclass
+class Ticket:
+    '''
+    A single support ticket.
+
+    # Attributes
+      `id`: The ticket number.
+      `guild_id`: ID of the server the ticket was opened in.
+      `user_id`: ID of the user who opened the ticket.
+      `user`: Display name of the user at the time the ticket was opened.
+      `title`: Title of the ticket.
+      `explanation`: Full explanation of the problem.
+      `contact`: How to contact the user. May be empty.
+      `status`: Either `open` or `closed`.
+      `created`: Unix timestamp of when the ticket was opened.
+      `message_id`: ID of the ticket's message in the help channel, if it was sent.
+    '''
+    _: KW_ONLY
+    id: int
+    guild_id: int | None
+    user_id: int
+    user: str
+    title: str
+    explanation: str
+    contact: str
+    status: str
+    created: float
+    message_id: int | None = None
+
+    def display(self) -> str:
+        # returns a one line summary for use in embeds
+        return f'**#{self.id}** ({self.status}) <@{self.user_id}> <t:{int(self.created)}:R>'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER,
+    user_id INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    title TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    contact TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'open',
+    created REAL NOT NULL,
+    message_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS tickets_user ON tickets (user_id, created);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+    title, explanation, user, status,
+    content='tickets', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS tickets_ai AFTER INSERT ON tickets BEGIN
+    INSERT INTO tickets_fts (rowid, title, explanation, user, status)
+    VALUES (new.id, new.title, new.explanation, new.user, new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_ad AFTER DELETE ON tickets BEGIN
+    INSERT INTO tickets_fts (tickets_fts, rowid, title, explanation, user, status)
+    VALUES ('delete', old.id, old.title, old.explanation, old.user, old.status);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_au AFTER UPDATE ON tickets BEGIN
+    INSERT INTO tickets_fts (tickets_fts, rowid, title, explanation, user, status)
+    VALUES ('delete', old.id, old.title, old.explanation, old.user, old.status);
+    INSERT INTO tickets_fts (rowid, title, explanation, user, status)
+    VALUES (new.id, new.title, new.explanation, new.user, new.status);
+END;
+'''
+
+_COLUMNS = 'id, guild_id, user_id, user, title, explanation, contact, status, created, message_id'
+
+class TicketStore:
+    '''
+    Persists support tickets and answers queries about them.
+
+    `duplicate_window` is how many seconds a user must wait before submitting
+    an identical ticket again.
+    '''
+    def __init__(self, path: str, *, duplicate_window: float = 300) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.duplicate_window = duplicate_window
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        if 'guild_id' not in [row[1] for row in self._db.execute('PRAGMA table_info(tickets)')]:
+            self._db.execute('ALTER TABLE tickets ADD COLUMN guild_id INTEGER') # stores made before multiple guilds were supported
+        self._db.execute('CREATE INDEX IF NOT EXISTS tickets_guild_status ON tickets (guild_id, status, created)')
+
+    def claim_unassigned(self, guild_id: int) -> int:
+        '''
+        Assign tickets stored before multiple guilds were supported, which have no server, to `guild_id`.
+        Returns how many were assigned.
+        '''
+        with self._db:
+            cursor = self._db.execute('UPDATE tickets SET guild_id = ? WHERE guild_id IS NULL', (guild_id,))
+        return cursor.rowcount
+
+    def _fetch(self, sql: str, params: tuple = ()) -> list[Ticket]:
+        return [
+            Ticket(**dict(zip(_COLUMNS.split(', '), row)))
+            for row in self._db.execute(sql, params)
+        ]
+
+    def add(self, *, guild_id: int, user_id: int, user: str, title: str, explanation: str, contact: str = '') -> Ticket:
+        with self._db:
+            cursor = self._db.execute(
+                'INSERT INTO tickets (guild_id, user_id, user, title, explanation, contact, created) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (guild_id, user_id, user, title.strip(), explanation.strip(), contact or '', time())
+            )
+        return self.get(cursor.lastrowid)
+
+    def delete(self, ticket_id: int) -> None:
+        '''
+        Delete a ticket, e.g. one whose message couldn't be sent.
+        '''
+        with self._db:
+            self._db.execute('DELETE FROM tickets WHERE id = ?', (ticket_id,))
+
+    def get(self, ticket_id: int) -> Ticket | None:
+        tickets = self._fetch(f'SELECT {_COLUMNS} FROM tickets WHERE id = ?', (ticket_id,))
+        return tickets[0] if tickets else None
+
+    def set_message(self, ticket_id: int, message_id: int) -> None:
+        with self._db:
+            self._db.execute('UPDATE tickets SET message_id = ? WHERE id = ?', (message_id, ticket_id))
+
+    def find_duplicate(self, *, guild_id: int, user_id: int, title: str, explanation: str) -> Ticket | None:
+        '''
+        Return a recent open ticket in the server by the same user with the same title and explanation, if there is one.
+        Tickets are stored stripped (see `add`), so surrounding whitespace and case are ignored.
+        '''
+        tickets = self._fetch(
+            f'''SELECT {_COLUMNS} FROM tickets
+            WHERE guild_id = ? AND user_id = ? AND created >= ? AND status = 'open'
+            AND lower(title) = lower(?) AND lower(explanation) = lower(?)
+            ORDER BY created DESC LIMIT 1''',
+            (guild_id, user_id, time() - self.duplicate_window, title.strip(), explanation.strip())
+        )
+        return tickets[0] if tickets else None
+
+    def search(self, guild_id: int, query: str, *, limit: int = 10) -> list[Ticket]:
+        '''
+        Full-text search over the title, explanation, user and status of a server's tickets, best matches first.
+        '''
+        expression = match_expression(query)
+        if not expression:
+            return []
+        return self._fetch(
+            f'''SELECT {', '.join('tickets.' + column for column in _COLUMNS.split(', '))}
+            FROM tickets_fts JOIN tickets ON tickets.id = tickets_fts.rowid
+            WHERE tickets_fts MATCH ? AND tickets.guild_id = ? ORDER BY bm25(tickets_fts) LIMIT ?''',
+            (expression, guild_id, limit)
+        )
+
+    def open_tickets(self, guild_id: int, *, limit: int = 25) -> list[Ticket]:
+        return self._fetch(
+            f"SELECT {_COLUMNS} FROM tickets WHERE guild_id = ? AND status = 'open' ORDER BY created LIMIT ?",
+            (guild_id, limit)
+        )
+
+    def close(self, guild_id: int, ticket_id: int) -> bool:
+        '''
+        Close a server's ticket. Returns False if the ticket doesn't exist or is already closed.
+        '''
+        with self._db:
+            cursor = self._db.execute("UPDATE tickets SET status = 'closed' WHERE id = ? AND guild_id = ? AND status = 'open'", (ticket_id, guild_id))
+        return cursor.rowcount > 0
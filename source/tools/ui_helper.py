@@ -92,3 +92,192 @@ def make_fail_embed(*, title: str, msg: str, args: dict, color: int = 0xdb1a1a):
             for key, param in args.items() if param and isinstance(param, (str, int, discord.Member))
         ]
     })
+
+# ---------------------------------------
+#            Embed Templates
+# ---------------------------------------
+# see https://discord.com/developers/docs/resources/channel#embed-object-embed-limits
+EMBED_LIMITS = {
+    'title': 256,
+    'description': 4096,
+    'fields': 25,
+    'field_name': 256,
+    'field_value': 1024,
+    'footer': 2048,
+    'author': 256,
+    'total': 6000, # per embed, and across every embed of a message
+    'embeds': 10, # per message
+}
+
+def truncate(text: str | None, limit: int) -> str | None:
+    '''
+    Shorten `text` to at most `limit` characters, marking the cut with an ellipsis.
+    '''
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit - 1] + '…'
+
+def split_text(text: str, limit: int) -> list[str]:
+    '''
+    Split `text` into pieces of at most `limit` characters, preferably at a line break, otherwise at a space.
+    '''
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(' ', 0, limit + 1)
+        if cut <= 0:
+            pieces.append(text[:limit])
+            text = text[limit:]
+        else:
+            pieces.append(text[:cut])
+            text = text[cut + 1:] # the line break or space it was cut at
+    pieces.append(text)
+    return pieces
+
+def _parts(spec: dict) -> tuple[dict, dict[str, int]]:
+    # converts a `generate_embed` style dictionary (except its fields) to Discord's embed payload, with the characters
+    # each key counts towards the total. labels (title, author, footer) are truncated to their limits, while the
+    # description is kept as a list of pieces within its limit
+    payload, lengths = {}, {}
+    for key, value in spec.items():
+        if value is None:
+            continue
+        match key:
+            case 'author' if isinstance(value, dict):
+                author = payload['author'] = {'name': truncate(str(value['name']), EMBED_LIMITS['author'])}
+                if value.get('url'):
+                    author['url'] = str(value['url'])
+                if value.get('icon_url'):
+                    author['icon_url'] = str(value['icon_url'])
+                lengths['author'] = len(author['name'])
+            case 'footer' if isinstance(value, dict):
+                footer = payload['footer'] = {'text': truncate(str(value.get('text') or ''), EMBED_LIMITS['footer'])}
+                if value.get('icon_url'):
+                    footer['icon_url'] = str(value['icon_url'])
+                lengths['footer'] = len(footer['text'])
+            case 'title':
+                payload['title'] = truncate(str(value), EMBED_LIMITS['title'])
+                lengths['title'] = len(payload['title'])
+            case 'description':
+                payload['description'] = split_text(str(value), EMBED_LIMITS['description'])
+                lengths['description'] = len(str(value))
+            case 'image' | 'thumbnail':
+                payload[key] = {'url': str(value)}
+            case 'color' | 'colour':
+                payload['color'] = int(value)
+            case 'timestamp':
+                payload['timestamp'] = value.isoformat()
+            case 'url':
+                payload['url'] = str(value)
+            case _:
+                pass
+    return payload, lengths
+
+def _fields(fields: list[dict]) -> tuple[list[dict], int]:
+    # each field as Discord's payload, with their total length. a value over the limit is split across several fields of the same name
+    payload, length = [], 0
+    for item in fields:
+        name, value, inline = str(item['name']), str(item['value']), item.get('inline', False)
+        if len(name) > EMBED_LIMITS['field_name']:
+            name = truncate(name, EMBED_LIMITS['field_name'])
+        length += len(name) * -(-len(value) // EMBED_LIMITS['field_value']) + len(value)
+        if len(value) <= EMBED_LIMITS['field_value']:
+            payload.append({'name': name, 'value': value, 'inline': inline})
+        else:
+            payload.extend({'name': name, 'value': piece, 'inline': inline} for piece in split_text(value, EMBED_LIMITS['field_value']))
+    return payload, length
+
+_HEADER = ('author', 'title', 'url', 'thumbnail', 'color')
+_TRAILER = ('image', 'footer', 'timestamp')
+
+class EmbedTemplate:
+    '''
+    An embed spec whose static part is converted and measured once, so that only the values given to `render` are processed each time.\n
+    The spec uses the same format as `generate_embed`. Values given when rendering replace
+    the ones in the spec, except `fields`, which are appended after the spec's fields.
+    ```python
+    template = EmbedTemplate({'color': 0x0ec940, 'footer': {'text': 'DS UCSB'}})
+    embeds = template.render({'title': 'Hello', 'fields': [{'name': 'a', 'value': 'b'}]})
+    for group in message_groups(embeds):
+        await channel.send(embeds=group)
+    ```
+    '''
+    def __init__(self, spec: dict) -> None:
+        self._payload, self._lengths = _parts(spec)
+        self._length = sum(self._lengths.values())
+        self._fields, fields_length = _fields(spec.get('fields') or [])
+        self._length += fields_length
+
+    def render(self, values: dict = None) -> list[discord.Embed]:
+        '''
+        Return the embeds holding everything in the spec and `values`, each within Discord's limits.
+        Usually that's one embed. Otherwise the description and fields continue in further embeds,
+        the first keeping the author, title and thumbnail, and the last the image, footer and timestamp.
+        Send them with `message_groups`, since they may not all fit in one message.
+        '''
+        payload, length = self._payload, self._length
+        # the static fields are copied, since Embed.from_dict keeps them and they may be edited later
+        fields = [dict(field) for field in self._fields]
+        if values:
+            dynamic, lengths = _parts(values)
+            payload = {**payload, **dynamic}
+            # values replace the static ones, except fields, which are added
+            length += sum(lengths.values()) - sum(self._lengths.get(key, 0) for key in lengths)
+            if values.get('fields'):
+                dynamic_fields, fields_length = _fields(values['fields'])
+                fields += dynamic_fields
+                length += fields_length
+        else:
+            payload = dict(payload)
+
+        description = payload.pop('description', ())
+        if length <= EMBED_LIMITS['total'] and len(fields) <= EMBED_LIMITS['fields'] and len(description) <= 1:
+            if description:
+                payload['description'] = description[0]
+            if fields:
+                payload['fields'] = fields
+            return [discord.Embed.from_dict(payload)]
+        return _split(payload, description, fields)
+
+def _split(payload: dict, description: list[str], fields: list[dict]) -> list[discord.Embed]:
+    # spreads a payload too large for one embed over several, keeping every piece of the description and every field
+    header = {key: payload[key] for key in _HEADER if key in payload}
+    trailer = {key: payload[key] for key in _TRAILER if key in payload}
+    budget = EMBED_LIMITS['total'] - len(payload.get('footer', {}).get('text', '')) # any embed may be the last, which holds the footer
+
+    payloads, length = [header], len(header.get('title', '')) + len(header.get('author', {}).get('name', ''))
+    def new_payload() -> dict:
+        nonlocal length
+        payloads.append({'color': header['color']} if 'color' in header else {})
+        length = 0
+        return payloads[-1]
+
+    current = header
+    for piece in description:
+        if 'description' in current or length + len(piece) > budget:
+            current = new_payload()
+        current['description'] = piece
+        length += len(piece)
+    for field in fields:
+        size = len(field['name']) + len(field['value'])
+        if len(current.get('fields', ())) >= EMBED_LIMITS['fields'] or length + size > budget:
+            current = new_payload()
+        current.setdefault('fields', []).append(field)
+        length += size
+
+    current.update(trailer)
+    return [discord.Embed.from_dict(payload) for payload in payloads]
+
+def message_groups(embeds: list[discord.Embed]) -> list[list[discord.Embed]]:
+    '''
+    Group embeds, in order, into as few messages as Discord's limits on embeds and characters per message allow.
+    '''
+    groups, length = [], 0
+    for embed in embeds:
+        if not groups or len(groups[-1]) >= EMBED_LIMITS['embeds'] or length + len(embed) > EMBED_LIMITS['total']:
+            groups.append([])
+            length = 0
+        groups[-1].append(embed)
+        length += len(embed)
+    return groups
@@ -1,9 +1,9 @@
 import discord
 import asyncio
 import aiohttp
-import json
 import gspread
 from datetime import datetime as dt
+from source.tools.config import CONFIG
 
 # ---------------------------------------
 #             Member Status
@@ -18,21 +18,38 @@ class _CacheClient(gspread.Client):
     def __init__(self, auth, session=None):
         super().__init__(auth, session)
         self.last_updated = dt.now()
-        self._users = set(lower(self.open_by_key(SHEETS_CONFIG['sheet_id']).sheet1.col_values(SHEETS_CONFIG['user_column'])))
+        self._users = set(lower(self.open_by_key(CONFIG.sheets.sheet_id).sheet1.col_values(CONFIG.sheets.user_column)))
 
     @property
     def users(self) -> set[str]:
         now = dt.now()
         time_difference = now - self.last_updated
         if time_difference.total_seconds() >= 30: # update every 30 seconds
-            self._users = set(lower(self.open_by_key(SHEETS_CONFIG['sheet_id']).sheet1.col_values(SHEETS_CONFIG['user_column'])))
+            self._users = set(lower(self.open_by_key(CONFIG.sheets.sheet_id).sheet1.col_values(CONFIG.sheets.user_column)))
             self.last_updated = now
         return self._users
 
-with open('secrets/sheets_config.json') as file:
-    SHEETS_CONFIG = json.load(file)
-GC: _CacheClient = gspread.service_account(filename='secrets/sheets_credentials.json', scopes=SHEETS_CONFIG['scopes'], client_factory=_CacheClient)
+_client: _CacheClient | None = None
 
-def check_member_status(member: discord.Member) -> bool:
+def sheets_client() -> _CacheClient:
+    '''
+    Return the sheets client, connecting on first use rather than at import.
+    '''
+    global _client
+    if _client is None:
+        _client = gspread.service_account(filename='secrets/sheets_credentials.json', scopes=CONFIG.sheets.scopes, client_factory=_CacheClient)
+    return _client
+
+def _roster_name(member: discord.Member) -> str:
     query = member.name if member.discriminator == '0' else f'{member.name}#{member.discriminator}' # to allow for legacy users
-    return query.lower() in GC.users
+    return query.lower()
+
+def check_member_status(member: discord.Member) -> bool:
+    return _roster_name(member) in sheets_client().users
+
+def check_member_statuses(members: list[discord.Member]) -> list[bool]:
+    '''
+    Batched version of `check_member_status`. The roster is read once for the whole batch.
+    '''
+    users = sheets_client().users
+    return [_roster_name(member) in users for member in members]